@@ -0,0 +1,100 @@
+"""
+Bandwidth and CPU per stream for the PCM and u-law audio transports.
+
+Replays synthetic audio through the same framing main.py uses (JSON message
+with base64 payload): 200 ms inbound chunks from the browser recorder and
+small outbound model chunks, batched by AudioFrameBatcher for compressed
+codecs. Reports wire bytes per second of audio and server CPU per second of
+audio in each direction.
+
+    python -m benchmarks.bench_codec [--seconds 120] [--model-chunk-ms 20]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+
+from benchmarks.bench_vad import synth_audio
+from tools.audio_codec import (
+    CODEC_MIME_TYPES, OUTBOUND_SAMPLE_RATE, AudioFrameBatcher,
+    decode_to_pcm, encode_from_pcm, mulaw_encode,
+)
+
+INBOUND_SAMPLE_RATE = 16000
+INBOUND_CHUNK_MS = 200
+
+
+def split(pcm: bytes, sample_rate: int, chunk_ms: int) -> list:
+    chunk_bytes = sample_rate * chunk_ms // 1000 * 2
+    return [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+
+
+def bench_inbound(codec: str, chunks: list):
+    """Browser -> server: parse the JSON message and decode to PCM for send_realtime."""
+    mime_type = CODEC_MIME_TYPES[codec]
+    messages = [
+        json.dumps({
+            "mime_type": mime_type,
+            "data": base64.b64encode(mulaw_encode(c) if codec == "mulaw" else c).decode("ascii"),
+        })
+        for c in chunks
+    ]
+    started = time.perf_counter()
+    for message_json in messages:
+        message = json.loads(message_json)
+        decode_to_pcm(message["mime_type"], base64.b64decode(message["data"]))
+    return sum(len(m) for m in messages), time.perf_counter() - started
+
+
+async def bench_outbound(codec: str, chunks: list):
+    """Server -> browser: batch (compressed codecs only), encode in the pool, frame as JSON."""
+    batcher = AudioFrameBatcher() if codec != "pcm" else None
+    wire_bytes = 0
+    messages = 0
+
+    async def send(pcm):
+        nonlocal wire_bytes, messages
+        encoded = await encode_from_pcm(codec, pcm)
+        wire_bytes += len(json.dumps({
+            "mime_type": CODEC_MIME_TYPES[codec],
+            "data": base64.b64encode(encoded).decode("ascii"),
+        }))
+        messages += 1
+
+    started = time.perf_counter()
+    for chunk in chunks:
+        batch = batcher.add(chunk) if batcher else chunk
+        if batch:
+            await send(batch)
+    if batcher:
+        batch = batcher.flush()
+        if batch:
+            await send(batch)
+    return wire_bytes, messages, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--model-chunk-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    inbound = split(synth_audio(args.seconds, 0.5, seed=1), INBOUND_SAMPLE_RATE, INBOUND_CHUNK_MS)
+    # synth_audio generates 16 kHz audio; 1.5x the samples stands in for 24 kHz model output.
+    outbound_pcm = synth_audio(args.seconds * 1.5, 1.0, seed=2)
+    outbound = split(outbound_pcm, OUTBOUND_SAMPLE_RATE, args.model_chunk_ms)
+
+    print(f"{args.seconds:.0f} s of audio per direction; model chunks of {args.model_chunk_ms} ms\n")
+    print(f"{'codec':<7}{'dir':<10}{'kB/s':>10}{'msgs/s':>10}{'CPU us/s':>12}")
+    for codec in ("pcm", "mulaw"):
+        wire, elapsed = bench_inbound(codec, inbound)
+        print(f"{codec:<7}{'inbound':<10}{wire / args.seconds / 1000:>10.1f}"
+              f"{len(inbound) / args.seconds:>10.1f}{elapsed / args.seconds * 1e6:>12.1f}")
+        wire, messages, elapsed = asyncio.run(bench_outbound(codec, outbound))
+        print(f"{codec:<7}{'outbound':<10}{wire / args.seconds / 1000:>10.1f}"
+              f"{messages / args.seconds:>10.1f}{elapsed / args.seconds * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Per-frame CPU cost and suppression ratio of the streaming VAD.
+
+Feeds synthetic 16 kHz PCM16 audio (alternating speech-like bursts and
+near-silent mic noise) through StreamingVAD in the same 200 ms chunks that
+static/js/app.js sends, and reports timing and the suppressed-frame ratio.
+
+    python -m benchmarks.bench_vad [--seconds 600] [--speech-fraction 0.3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from tools.audio_vad import StreamingVAD
+
+SAMPLE_RATE = 16000
+CHUNK_MS = 200
+
+
+def synth_audio(seconds: float, speech_fraction: float, seed: int = 0) -> bytes:
+    """Builds alternating 2-8 s segments of voiced tone bursts and low-level noise."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    out = np.empty(total, dtype=np.float32)
+    pos = 0
+    while pos < total:
+        speaking = rng.random() < speech_fraction
+        length = min(total - pos, int(rng.uniform(2, 8) * SAMPLE_RATE))
+        t = np.arange(length) / SAMPLE_RATE
+        if speaking:
+            pitch = rng.uniform(100, 250)
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)  # ~4 syllables per second
+            segment = 0.3 * envelope * np.sin(2 * np.pi * pitch * t)
+            segment += 0.1 * envelope * np.sin(2 * np.pi * 3 * pitch * t)
+        else:
+            segment = rng.normal(0, 0.002, length)
+        out[pos:pos + length] = segment
+        pos += length
+    return (np.clip(out, -1, 1) * 0x7fff).astype("<i2").tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--speech-fraction", type=float, default=0.3)
+    args = parser.parse_args()
+
+    pcm = synth_audio(args.seconds, args.speech_fraction)
+    chunk_bytes = SAMPLE_RATE * CHUNK_MS // 1000 * 2
+    chunks = [pcm[i:i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+
+    vad = StreamingVAD(sample_rate=SAMPLE_RATE)
+    forwarded_bytes = 0
+    n_events = 0
+    started = time.perf_counter()
+    for chunk in chunks:
+        audio, events = vad.process(chunk)
+        forwarded_bytes += len(audio)
+        n_events += len(events)
+    elapsed = time.perf_counter() - started
+
+    metrics = vad.metrics
+    print(f"audio:              {args.seconds:.0f} s in {len(chunks)} chunks of {CHUNK_MS} ms")
+    print(f"frames:             {metrics.frames_total} ({vad.frame_len} samples each)")
+    print(f"suppressed ratio:   {metrics.suppressed_ratio:.1%}")
+    print(f"bytes forwarded:    {forwarded_bytes} / {len(pcm)}")
+    print(f"speech events:      {n_events}")
+    print(f"CPU per frame:      {metrics.seconds_per_frame * 1e6:.2f} us")
+    print(f"CPU per chunk:      {elapsed / len(chunks) * 1e6:.2f} us")
+    print(f"realtime factor:    {args.seconds / elapsed:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
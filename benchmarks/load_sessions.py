@@ -0,0 +1,200 @@
+"""
+Load harness for live sessions on a single worker.
+
+Simulates sessions arriving as a Poisson process against one worker whose
+per-turn latency degrades once more sessions are active than it has
+capacity for (CPU and upstream quota are shared). Times are simulated
+seconds, compressed by --time-scale so a full run takes a few seconds.
+
+Sessions call the history tool after some of their turns have been saved,
+and the support-matrix tool once. Tool latency and the number of fetches
+actually run are compared without prefetch (every call fetches, as the plain
+tools do) and with the connect-time prefetch: past sessions in a per-session
+SessionPrefetch merged with the live session's saved turns, and the support
+matrix in one SharedPrefetch for the whole worker. Each prefetched history is
+checked to start with every turn saved so far. Admission control is measured
+end to end against the real app by benchmarks/load_websocket.py.
+
+    python -m benchmarks.load_sessions [--duration 300] [--capacity 8]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from tools.admission import SESSION_AUDIO, AdmissionController, AdmissionRejected
+from tools.history_store import LiveSessionTurns
+from tools.prefetch import PREFETCH_HISTORY, PREFETCH_SUPPORT_MATRIX, SessionPrefetch, SharedPrefetch
+
+TURNS_PER_SESSION = 5
+THINK_TIME_S = 2.0     # user speaking / pause between turns
+TURN_WORK_S = 0.5      # model + server work per turn on an idle worker
+
+SESSION_SETUP_S = 0.3  # runner + session creation before the first turn
+HISTORY_FETCH_S = 1.5  # load_user_history_from_bq query
+SUPPORT_FETCH_S = 0.8  # perform_gcs_read_tool_function download
+HISTORY_TOOL_TURNS = (1, 3)  # turns in which the history tool is called, after earlier turns were saved
+SUPPORT_TOOL_TURN = 2  # turn in which the support-matrix tool is called
+SUPPORT_TTL_S = 600    # support-matrix cache lifetime
+
+PAST_SESSIONS = [{"session_id": f"past{i}", "turns": [{"user": "q", "agent": "a"}]} for i in range(3)]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class SimulatedWorker:
+    """Turn latency grows linearly once active sessions exceed capacity."""
+
+    def __init__(self, capacity: int, time_scale: float):
+        self.capacity = capacity
+        self.time_scale = time_scale
+        self.active = 0
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds * self.time_scale)
+
+    async def run_turn(self) -> float:
+        latency = TURN_WORK_S * max(1.0, self.active / self.capacity)
+        await self.sleep(latency)
+        return latency
+
+
+def _blocking_fetch(seconds: float, time_scale: float, fetches: dict, name: str, result):
+    def fetch(key):
+        fetches[name] += 1
+        time.sleep(seconds * time_scale)
+        return result
+    return fetch
+
+
+async def run_session(worker, admission, results, rng, support_cache, prefetch_mode=None):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    positions = []
+
+    async def on_position(position):
+        positions.append(position)
+
+    try:
+        if admission:
+            await admission.acquire(SESSION_AUDIO, on_position)
+    except AdmissionRejected:
+        results["rejected"] += 1
+        return
+    results["queue_waits"].append((loop.time() - started) / worker.time_scale)
+    results["position_updates"] += len(positions)
+
+    prefetch = SessionPrefetch() if prefetch_mode == "on" else None
+    support = support_cache if prefetch_mode == "on" else None
+    live_turns = LiveSessionTurns()
+    fetch_history = _blocking_fetch(
+        HISTORY_FETCH_S, worker.time_scale, results["fetches"], PREFETCH_HISTORY, PAST_SESSIONS
+    )
+    fetch_support = _blocking_fetch(
+        SUPPORT_FETCH_S, worker.time_scale, results["fetches"], PREFETCH_SUPPORT_MATRIX, ["matrix"]
+    )
+    if prefetch:
+        prefetch.start(PREFETCH_HISTORY, fetch_history, "user")
+        support.start(PREFETCH_SUPPORT_MATRIX, fetch_support, "bucket")
+
+    async def call_tool(cache, name, fetch, key):
+        tool_started = loop.time()
+        # Without prefetch every call fetches, as the plain tools do
+        result = await cache.get(name, fetch, key) if cache else await asyncio.to_thread(fetch, key)
+        if name == PREFETCH_HISTORY:
+            result = live_turns.merge_into(result)
+        results["tool_latencies"][name].append((loop.time() - tool_started) / worker.time_scale)
+        return result
+
+    worker.active += 1
+    try:
+        await worker.sleep(SESSION_SETUP_S)
+        for turn in range(TURNS_PER_SESSION):
+            await worker.sleep(rng.expovariate(1 / THINK_TIME_S))
+            if prefetch_mode and turn in HISTORY_TOOL_TURNS:
+                history = await call_tool(prefetch, PREFETCH_HISTORY, fetch_history, "user")
+                if len(history[0]["turns"]) != turn:
+                    results["stale_history"] += 1
+            if prefetch_mode and turn == SUPPORT_TOOL_TURN:
+                await call_tool(support, PREFETCH_SUPPORT_MATRIX, fetch_support, "bucket")
+            results["turn_latencies"].append(await worker.run_turn())
+            live_turns.add("live", f"q{turn}", "a")
+    finally:
+        if prefetch:
+            prefetch.cancel()
+            for stat, count in prefetch.stats.items():
+                results["prefetch"][stat] += count
+        worker.active -= 1
+        if admission:
+            admission.release(SESSION_AUDIO)
+    results["completed"] += 1
+
+
+async def run_scenario(load_factor, use_admission, args, prefetch_mode=None):
+    rng = random.Random(args.seed)
+    worker = SimulatedWorker(args.capacity, args.time_scale)
+    admission = AdmissionController(
+        max_active={SESSION_AUDIO: args.capacity},
+        max_queued={SESSION_AUDIO: args.capacity},
+        queue_timeout_s=args.queue_timeout * args.time_scale,
+    ) if use_admission else None
+
+    session_length = TURNS_PER_SESSION * (THINK_TIME_S + TURN_WORK_S)
+    arrival_rate = load_factor * args.capacity / session_length
+    results = {
+        "turn_latencies": [], "queue_waits": [], "tool_latencies": {PREFETCH_HISTORY: [], PREFETCH_SUPPORT_MATRIX: []},
+        "rejected": 0, "completed": 0, "position_updates": 0, "stale_history": 0,
+        "prefetch": {"hits": 0, "joins": 0, "misses": 0},
+        "fetches": {PREFETCH_HISTORY: 0, PREFETCH_SUPPORT_MATRIX: 0},
+    }
+    support_cache = SharedPrefetch(ttl_s=SUPPORT_TTL_S * args.time_scale)
+
+    sessions = []
+    elapsed = 0.0
+    while elapsed < args.duration:
+        gap = rng.expovariate(arrival_rate)
+        elapsed += gap
+        await worker.sleep(gap)
+        sessions.append(asyncio.create_task(run_session(worker, admission, results, rng, support_cache, prefetch_mode)))
+    await asyncio.gather(*sessions)
+    results["offered"] = len(sessions)
+    results["support_cache"] = support_cache.stats
+    return results
+
+
+def prefetch_scenario(args):
+    print(f"history fetch={HISTORY_FETCH_S}s (turns {', '.join(str(t + 1) for t in HISTORY_TOOL_TURNS)}), "
+          f"support fetch={SUPPORT_FETCH_S}s (turn {SUPPORT_TOOL_TURN + 1}), "
+          f"session setup={SESSION_SETUP_S}s, load 1.0x with admission\n")
+    print(f"{'prefetch':>8} {'tool':>15} {'calls':>6} {'fetches':>8} {'p50':>8} {'p99':>8}")
+    for prefetch_mode in ("off", "on"):
+        r = asyncio.run(run_scenario(1.0, True, args, prefetch_mode))
+        for tool, latencies in r["tool_latencies"].items():
+            print(f"{prefetch_mode:>8} {tool:>15} {len(latencies):>6} {r['fetches'][tool]:>8} "
+                  f"{statistics.median(latencies):>7.2f}s {percentile(latencies, 99):>7.2f}s")
+        if prefetch_mode == "on":
+            print(f"{'':>8} session prefetch stats: {r['prefetch']}")
+            print(f"{'':>8} shared cache stats: {r['support_cache']}")
+            print(f"{'':>8} histories missing saved turns: {r['stale_history']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=300, help="simulated seconds of arrivals")
+    parser.add_argument("--capacity", type=int, default=8, help="sessions a worker serves without slowing down")
+    parser.add_argument("--queue-timeout", type=float, default=10, help="simulated seconds a session may queue")
+    parser.add_argument("--time-scale", type=float, default=0.005, help="real seconds per simulated second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    prefetch_scenario(args)
+
+
+if __name__ == "__main__":
+    main()
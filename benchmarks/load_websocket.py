@@ -0,0 +1,209 @@
+"""
+End-to-end load test for admission control on a single worker.
+
+Runs the real FastAPI app (main.app) under uvicorn on a local port and drives
+it with concurrent websocket clients arriving as a Poisson process. Only the
+model is stubbed: start_agent_session waits SESSION_SETUP_S, and each turn
+read from the real LiveRequestQueue does TURN_WORK_S of blocking work on a
+thread pool with --capacity threads, standing in for the shared upstream
+quota. Above capacity, turns queue for that pool just as they would for the
+real model. Turns are saved to an in-memory SQLite store instead of BigQuery.
+
+Every load level runs once without admission limits and once behind the
+AdmissionController. Latencies are measured by the clients: "first answer"
+runs from opening the socket to the first turn_complete, so it includes the
+queue wait and session setup.
+
+    python -m benchmarks.load_websocket [--duration 8] [--capacity 8] [--queue-timeout 2]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+import uvicorn
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+from tools.admission import SESSION_AUDIO, SESSION_TEXT, WS_CLOSE_TRY_AGAIN_LATER, AdmissionController
+from tools.history_store import SQLiteTurnStore
+
+TURNS_PER_SESSION = 3
+THINK_TIME_S = 0.05      # pause between a turn_complete and the next message
+TURN_WORK_S = 0.2        # upstream work per turn on an idle worker
+SESSION_SETUP_S = 0.05   # runner + session creation before the first turn
+UNLIMITED = 1_000_000
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def load_app():
+    """Imports main.py without Google Cloud credentials and swaps in the stubbed model."""
+    with mock.patch("google.cloud.bigquery.Client"):
+        import main
+    store = SQLiteTurnStore()
+    store.ensure_table()
+    main.history_store = store
+    main.start_agent_session = stub_agent_session
+    return main
+
+
+# The thread pool the stubbed model runs turns on; replaced per scenario
+upstream = SimpleNamespace(pool=None)
+
+
+def _text_event(text=None, turn_complete=False):
+    part = SimpleNamespace(text=text, inline_data=None)
+    return SimpleNamespace(
+        content=SimpleNamespace(parts=[part]) if text else None,
+        partial=True, turn_complete=turn_complete, interrupted=False,
+    )
+
+
+async def stub_agent_session(user_id, prefetch, live_turns, is_audio=False, explicit_activity=False):
+    from google.adk.agents.live_request_queue import LiveRequestQueue
+
+    await asyncio.sleep(SESSION_SETUP_S)
+    live_request_queue = LiveRequestQueue()
+
+    async def live_events():
+        loop = asyncio.get_running_loop()
+        while True:
+            request = await live_request_queue.get()
+            if request.close:
+                return
+            if request.content:
+                await loop.run_in_executor(upstream.pool, time.sleep, TURN_WORK_S)
+                yield _text_event("ok")
+                yield _text_event(turn_complete=True)
+
+    return live_events(), live_request_queue, f"session-{user_id}-{random.random()}"
+
+
+class ServerThread:
+    """Serves an ASGI app from a background thread on a free local port."""
+
+    def __init__(self, app):
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="error", ws="websockets")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def run_client(port, client_id, results, rng):
+    started = time.monotonic()
+    url = f"ws://127.0.0.1:{port}/ws/{client_id}?is_audio=false"
+    try:
+        async with connect(url, open_timeout=None, ping_interval=None) as websocket:
+            while True:
+                if json.loads(await websocket.recv()).get("admitted"):
+                    break
+            results["admit_waits"].append(time.monotonic() - started)
+
+            for turn in range(TURNS_PER_SESSION):
+                if turn:
+                    await asyncio.sleep(rng.expovariate(1 / THINK_TIME_S))
+                sent = time.monotonic()
+                await websocket.send(json.dumps({"mime_type": "text/plain", "data": f"question {turn}"}))
+                while not json.loads(await websocket.recv()).get("turn_complete"):
+                    pass
+                results["turn_latencies"].append(time.monotonic() - sent)
+                if turn == 0:
+                    results["first_answer"].append(time.monotonic() - started)
+    except ConnectionClosed as e:
+        if e.rcvd and e.rcvd.code == WS_CLOSE_TRY_AGAIN_LATER:
+            results["shed"] += 1
+            return
+        results["errors"] += 1
+
+
+async def run_load(port, load_factor, args):
+    rng = random.Random(args.seed)
+    session_length = SESSION_SETUP_S + TURNS_PER_SESSION * (THINK_TIME_S + TURN_WORK_S)
+    arrival_rate = load_factor * args.capacity / session_length
+    results = {
+        "admit_waits": [], "first_answer": [], "turn_latencies": [],
+        "shed": 0, "errors": 0,
+    }
+
+    clients = []
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(rng.expovariate(arrival_rate))
+        clients.append(asyncio.create_task(run_client(port, len(clients), results, rng)))
+    await asyncio.gather(*clients)
+    results["offered"] = len(clients)
+    return results
+
+
+def run_scenario(main, port, load_factor, use_admission, args):
+    limit = args.capacity if use_admission else UNLIMITED
+    main.admission = AdmissionController(
+        max_active={SESSION_AUDIO: limit, SESSION_TEXT: limit},
+        max_queued={SESSION_AUDIO: limit, SESSION_TEXT: limit},
+        queue_timeout_s=args.queue_timeout,
+    )
+    upstream.pool = ThreadPoolExecutor(max_workers=args.capacity)
+    try:
+        return asyncio.run(run_load(port, load_factor, args))
+    finally:
+        upstream.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=8, help="seconds of arrivals per run")
+    parser.add_argument("--capacity", type=int, default=8, help="concurrent turns the stubbed model serves")
+    parser.add_argument("--queue-timeout", type=float, default=2, help="seconds a session may queue")
+    parser.add_argument("--loads", type=float, nargs="+", default=[0.5, 1.0, 2.0, 4.0])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = sys.stdout
+    print(f"capacity={args.capacity} sessions, {TURNS_PER_SESSION} turns/session, "
+          f"{TURN_WORK_S}s work/turn, queue={args.capacity}, timeout={args.queue_timeout}s\n", file=report)
+    print(f"{'load':>5} {'admission':>10} {'sessions':>9} {'shed':>6} {'errors':>7} "
+          f"{'p50 turn':>9} {'p99 turn':>9} {'p99 wait':>9} {'p99 first':>10}", file=report)
+
+    # The app logs every message with print(); keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        app_module = load_app()
+        with ServerThread(app_module.app) as server:
+            for load_factor in args.loads:
+                for use_admission in (False, True):
+                    r = run_scenario(app_module, server.port, load_factor, use_admission, args)
+                    turns = r["turn_latencies"]
+                    print(f"{load_factor:>4.1f}x {'on' if use_admission else 'off':>10} {r['offered']:>9} "
+                          f"{r['shed'] / r['offered']:>6.1%} {r['errors']:>7} "
+                          f"{statistics.median(turns) if turns else float('nan'):>8.2f}s "
+                          f"{percentile(turns, 99):>8.2f}s "
+                          f"{percentile(r['admit_waits'], 99):>8.2f}s "
+                          f"{percentile(r['first_answer'], 99):>9.2f}s", file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,12 @@ from typing import Optional, List
 from pydantic import BaseModel, Field
 from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool, VertexAiSearchTool, agent_tool
-from google.cloud import bigquery
 
 from tools.perform_gcs_tool import perform_gcs_read_tool_function
 from tools.email_tools import send_email_via_smtp
 from tools.remedy_tools import create_remedy_incident
+from tools.history_store import BigQueryTurnStore, LiveSessionTurns, format_history
+from tools.prefetch import SessionPrefetch, SharedPrefetch, PREFETCH_HISTORY, PREFETCH_SUPPORT_MATRIX
 
 # ──────────────────────────────────────────────
 # Environment Setup
@@ -27,12 +28,15 @@ DATASTORE_ID = f"projects/{VERTEX_SEARCH_PROJECT}/locations/{VERTEX_SEARCH_LOCAT
 
 BQ_PROJECT = "generativeai-coe"
 BQ_DATASET = "AgentDevelopmentKit"
-BQ_TABLE = "convo_pairs_rajat"
+history_store = BigQueryTurnStore(project=BQ_PROJECT, dataset=BQ_DATASET)
+
+SUPPORT_MATRIX_TTL_S = 600  # the bucket rarely changes; one download serves every session for this long
 
 # ──────────────────────────────────────────────
 # Tool Wrapping
 # ──────────────────────────────────────────────
 gcs_tool = FunctionTool(perform_gcs_read_tool_function)
+_read_gcs_documents = perform_gcs_read_tool_function  # unshadowed alias for the prefetched variant
 remedy_tool = FunctionTool(create_remedy_incident)
 email_tool = FunctionTool(send_email_via_smtp)
 
@@ -95,90 +99,112 @@ Make sure the tone of the email is that of the **user reporting or escalating**
 # ──────────────────────────────────────────────
 # Load Conversation History from BigQuery
 # ──────────────────────────────────────────────
+def _history_response(sessions) -> str:
+    if not sessions:
+        return "No past conversation history was found for this user."
+
+    # Pre-process the history into a single, clean string
+    formatted_history = format_history(sessions)
+
+    # This print statement is for your debugging
+    print("Formatted Past Convos ---------->\n", formatted_history)
+    return formatted_history
+
+
 def load_user_history_from_bq(user_id: str):
     """
     Fetches user conversation history and formats it into a clean string for the LLM.
-    """
-    client = bigquery.Client()
-    query = f"""
-WITH session_latest AS (
-  SELECT
-    session_id,
-    MAX(timestamp) AS latest_timestamp
-  FROM {BQ_PROJECT}.{BQ_DATASET}.{BQ_TABLE}
-  WHERE user_id = '{user_id}'
-  GROUP BY session_id
-),
-
--- Step 2: Rank sessions by latest timestamp (most recent first)
-ranked_sessions AS (
-  SELECT
-    session_id,
-    RANK() OVER (ORDER BY latest_timestamp DESC) AS session_rank
-  FROM session_latest
-),
-
--- Step 3: Join back to the main table to get messages from top 3 sessions
-final_sessions AS (
-  SELECT
-    c.session_id,
-    c.user_agent_pairs,
-    c.timestamp,
-    r.session_rank
-  FROM {BQ_PROJECT}.{BQ_DATASET}.{BQ_TABLE} c
-  JOIN ranked_sessions r
-    ON c.session_id = r.session_id
-  WHERE c.user_id = '{user_id}'
-)
-
--- Step 4: Only keep messages from top 3 sessions
-SELECT *
-FROM final_sessions
-WHERE session_rank <= 3
-ORDER BY session_rank, timestamp
     """
     try:
-        result = client.query(query).result()
-        rows = list(result)  # Consume iterator to check if it's empty
-
-        if not rows:
-            return "No past conversation history was found for this user."
-
-        # Pre-process the history into a single, clean string
-        formatted_history = ""
-        for i, row in enumerate(rows):
-            formatted_history += f"--- Conversation Session {i+1} ---\n"
-            conversation_pairs = row["user_agent_pairs"]
-            
-            # Check if the data is in the expected list-of-dicts format
-            if isinstance(conversation_pairs, list):
-                for pair in conversation_pairs:
-                    user_query = pair.get('user', 'N/A')
-                    # Flatten newlines in agent response for cleaner output
-                    agent_response = pair.get('agent', 'N/A').replace('\n', ' ') 
-                    formatted_history += f"User: {user_query}\nAgent: {agent_response}\n"
-            
-            formatted_history += "\n"
-
-        # This print statement is for your debugging
-        print("Formatted Past Convos ---------->\n", formatted_history)
-        return formatted_history
-
+        return _history_response(history_store.load_user_history(user_id))
     except Exception as e:
         print(f"An error occurred in load_user_history_from_bq: {traceback.format_exc()}")
         return "Sorry, I encountered an error while trying to retrieve your history."
 
+history_tool = FunctionTool(load_user_history_from_bq)
+
+# ──────────────────────────────────────────────
+# Prefetched Tool Variants
+# ──────────────────────────────────────────────
+# Same names and signatures as the plain tools, so the agent instructions are
+# unchanged. Past sessions come from the session's SessionPrefetch, merged with
+# the live session's saved turns; the support matrix from one cache shared by
+# every session on this worker.
+
+support_matrix_cache = SharedPrefetch(ttl_s=SUPPORT_MATRIX_TTL_S)
+
+
+class SupportMatrixReadError(Exception):
+    """A support-matrix read that reported errors; carries the documents so the tool can still return them."""
+
+    def __init__(self, documents: list):
+        super().__init__(f"{sum('error' in d for d in documents)} document(s) failed to load")
+        self.documents = documents
+
+
+def _read_support_matrix(bucket_name: str) -> list:
+    # The GCS tool reports failures as "error" entries instead of raising;
+    # raise here so the shared cache never keeps a partial or failed read.
+    documents = _read_gcs_documents(bucket_name)
+    if any("error" in d for d in documents):
+        raise SupportMatrixReadError(documents)
+    return documents
+
+
+def start_prefetch(prefetch: SessionPrefetch, user_id: str):
+    """Starts warming the data the tools are likely to ask for in this session."""
+    prefetch.start(PREFETCH_HISTORY, history_store.load_user_history, user_id)
+    support_matrix_cache.start(PREFETCH_SUPPORT_MATRIX, _read_support_matrix, DEFAULT_GCS_BUCKET)
+
+
+def build_history_tool(prefetch: Optional[SessionPrefetch] = None,
+                       live_turns: Optional[LiveSessionTurns] = None) -> FunctionTool:
+    if prefetch is None:
+        return history_tool
+
+    async def load_user_history_from_bq(user_id: str):
+        """
+        Fetches user conversation history and formats it into a clean string for the LLM.
+        """
+        try:
+            sessions = await prefetch.get(PREFETCH_HISTORY, history_store.load_user_history, user_id)
+            if live_turns is not None:
+                sessions = live_turns.merge_into(sessions)
+            return _history_response(sessions)
+        except Exception as e:
+            print(f"An error occurred in load_user_history_from_bq: {traceback.format_exc()}")
+            return "Sorry, I encountered an error while trying to retrieve your history."
+
+    return FunctionTool(load_user_history_from_bq)
+
+
+def build_gcs_tool(prefetch: Optional[SessionPrefetch] = None) -> FunctionTool:
+    if prefetch is None:
+        return gcs_tool
+
+    async def perform_gcs_read_tool_function(bucket_name: str = DEFAULT_GCS_BUCKET) -> list:
+        try:
+            return await support_matrix_cache.get(PREFETCH_SUPPORT_MATRIX, _read_support_matrix, bucket_name)
+        except SupportMatrixReadError as e:
+            # Let the agent see what failed, but do not cache it for other sessions
+            print(f"WARNING: Support matrix read failed, not cached: {e}")
+            return e.documents
+
+    return FunctionTool(perform_gcs_read_tool_function)
+
 # ──────────────────────────────────────────────
 # Search the big query for past conversations
 # ──────────────────────────────────────────────
-memory_recall_agent = LlmAgent(
-    model="gemini-2.0-flash",
-    name="MemoryRecallAgent",
-    description=(
-        "Agent to answer questions about BigQuery data and models and execute"
-        " SQL queries."
-    ),
-    instruction="""
+def build_memory_recall_agent(prefetch: Optional[SessionPrefetch] = None,
+                              live_turns: Optional[LiveSessionTurns] = None) -> LlmAgent:
+    return LlmAgent(
+        model="gemini-2.0-flash",
+        name="MemoryRecallAgent",
+        description=(
+            "Agent to answer questions about BigQuery data and models and execute"
+            " SQL queries."
+        ),
+        instruction="""
 You are a helpful assistant that summarizes past conversations session by session.
 
 1. When the user asks about previous conversations, call the BigQuery toolset and use `load_user_history_from_bq` to fetch session-wise chat history.
@@ -191,13 +217,16 @@ You are a helpful assistant that summarizes past conversations session by sessio
 
 Never output raw data or internal structures. Keep summaries concise, accurate, and user-friendly.
 """,
-    tools=[FunctionTool(load_user_history_from_bq)] # Give the agent the tool
-)
+        tools=[build_history_tool(prefetch, live_turns)] # Give the agent the tool
+    )
+
+memory_recall_agent = build_memory_recall_agent()
 
 # ──────────────────────────────────────────────
 # Root Agent
 # ──────────────────────────────────────────────
-def build_root_agent(user_id: str) -> LlmAgent:
+def build_root_agent(user_id: str, prefetch: Optional[SessionPrefetch] = None,
+                     live_turns: Optional[LiveSessionTurns] = None) -> LlmAgent:
 
     return LlmAgent(
         model="gemini-2.0-flash-exp",
@@ -254,11 +283,11 @@ Make sure to pass the {user_id}.
     - Use email_summary_agent to generate the summary from the conversation and for sending an email.
 """,
         tools=[
-            gcs_tool,
+            build_gcs_tool(prefetch),
             agent_tool.AgentTool(agent=doc_qa_agent),
             remedy_tool,
             agent_tool.AgentTool(agent=email_summary_agent),
-            agent_tool.AgentTool(agent=memory_recall_agent),
+            agent_tool.AgentTool(agent=build_memory_recall_agent(prefetch, live_turns) if prefetch else memory_recall_agent),
         ]
     )
 
@@ -3,11 +3,10 @@ import json
 import asyncio
 import base64
 import warnings
-from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
-from google.genai.types import Part, Content, Blob
+from google.genai.types import Part, Content, Blob, RealtimeInputConfig, AutomaticActivityDetection
 from google.cloud import bigquery
 from google.adk.runners import InMemoryRunner
 from google.adk.agents import LiveRequestQueue
@@ -17,9 +16,19 @@ from fastapi import FastAPI, WebSocket
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from google_search_agent.agent import build_root_agent  # ✅ fixed import
+from google_search_agent.agent import build_root_agent, start_prefetch  # ✅ fixed import
 from starlette.websockets import WebSocketDisconnect
 from google.cloud import speech
+from tools.history_store import BigQueryTurnStore, LiveSessionTurns
+from tools.audio_vad import SPEECH_START, StreamingVAD
+from tools.audio_codec import (
+    CODEC_PCM, CODEC_MIME_TYPES, MIME_TYPE_CODECS, AudioFrameBatcher,
+    decode_to_pcm, encode_from_pcm, negotiate_codec,
+)
+from tools.prefetch import SessionPrefetch
+from tools.admission import (
+    SESSION_AUDIO, SESSION_TEXT, WS_CLOSE_TRY_AGAIN_LATER, AdmissionController, AdmissionRejected,
+)
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 load_dotenv()
@@ -29,8 +38,8 @@ APP_NAME = "ADK Streaming example"
 # BigQuery setup
 BQ_PROJECT = "generativeai-coe"
 BQ_DATASET = "AgentDevelopmentKit"
-BQ_TABLE = "convo_pairs_rajat"
 bq_client = bigquery.Client()
+history_store = BigQueryTurnStore(client=bq_client, project=BQ_PROJECT, dataset=BQ_DATASET)
 
 try:
     speech_client = speech.SpeechClient()
@@ -42,6 +51,28 @@ except Exception as e:
 
 ua_pair = {}
 
+# Voice-activity detection on incoming microphone audio
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_CONFIG = {
+    "threshold_db": float(os.getenv("VAD_THRESHOLD_DB", "-45")),
+    "hangover_ms": int(os.getenv("VAD_HANGOVER_MS", "600")),
+    "preroll_ms": int(os.getenv("VAD_PREROLL_MS", "200")),
+    "max_utterance_ms": int(os.getenv("VAD_MAX_UTTERANCE_MS", "15000")),
+}
+
+# Per-worker admission control for live sessions
+admission = AdmissionController(
+    max_active={
+        SESSION_AUDIO: int(os.getenv("MAX_AUDIO_SESSIONS", "8")),
+        SESSION_TEXT: int(os.getenv("MAX_TEXT_SESSIONS", "32")),
+    },
+    max_queued={
+        SESSION_AUDIO: int(os.getenv("MAX_QUEUED_AUDIO_SESSIONS", "8")),
+        SESSION_TEXT: int(os.getenv("MAX_QUEUED_TEXT_SESSIONS", "32")),
+    },
+    queue_timeout_s=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30")),
+)
+
 # ──────────────────────────────────────────────
 # Speech-to-Text Utility Function
 # ──────────────────────────────────────────────
@@ -89,98 +120,36 @@ def transcribe_base64_audio(base64_string: str) -> str:
 
 
 def save_message_to_bq(user_id_str, new_user_agent_pair_dict, current_session_id):
-
-    user_type, session_id, old_row = get_latest_session_data_from_bq(user_id_str, current_session_id)
-    if user_type == "NEW USER":
-        print(1)
-        user = new_user_agent_pair_dict["user"]
-        agent = new_user_agent_pair_dict["agent"]
-        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-
-        query = f"""
-        INSERT INTO `{BQ_PROJECT}.{BQ_DATASET}.{BQ_TABLE}` (
-            user_id, session_id, user_agent_pairs, timestamp
-        )
-        VALUES (
-            '{user_id_str}', '{session_id}',
-            [STRUCT('{user}' AS user, '{agent}' AS agent)],
-            DATETIME '{timestamp}'
-        )"""
-        
-        # print(user, agent)
-        # print(query)
-        # print(2)
-
-        try:
-            print(3)
-            result = query_bq(query)
-            print(result, type(result))
-            print("✅ Insert Query executed successfully.")
-        except Exception as e:
-            print("❌ Query failed:", e)
-
-
-    else:
-        # OLD USER (in the same session)
-        # Escape single quotes (for SQL safety)
-        user = new_user_agent_pair_dict["user"].replace("'", "\\'")
-        agent = new_user_agent_pair_dict["agent"].replace("'", "\\'")
-
-        updated_query = f"""
-                    UPDATE `{BQ_PROJECT}.{BQ_DATASET}.{BQ_TABLE}`
-                    SET user_agent_pairs = ARRAY_CONCAT(user_agent_pairs, [
-                    STRUCT('{user}' AS user, '{agent}' AS agent)
-                    ])
-                    WHERE user_id = '{user_id_str}' AND session_id = '{session_id}'"""
-
-        print(f"Generated SQL query:\n{updated_query}")
-
-        try:
-            result = query_bq(updated_query)
-            print("row updated:", result)
-        except Exception as e:
-            print(e)
-
-
-def query_bq(query):
-    try:
-        results = bq_client.query(query).result()
-        return results
-    except Exception as e:
-        print(e)
-
-
-def get_latest_session_data_from_bq(user_id, current_session_id):
+    """Appends one user/agent turn to the turn-level history table."""
     try:
-        query = f"""
-                SELECT * 
-                FROM `{BQ_PROJECT}.{BQ_DATASET}.{BQ_TABLE}`
-                WHERE user_id = '{user_id}' and session_id = '{current_session_id}'
-                ORDER BY timestamp DESC
-                LIMIT 1"""
-        results = query_bq(query)
-        row = list(results)
-        if row:
-            print("OLD USER")
-            user_type = "OLD USER"
-            return user_type, current_session_id, row[0]
-        else:
-            print("NEW USER")
-            user_type = "NEW USER"
-            return user_type, current_session_id, row # here the row is empty
+        turn_seq = history_store.append_turn(
+            user_id_str,
+            current_session_id,
+            new_user_agent_pair_dict.get("user", ""),
+            new_user_agent_pair_dict.get("agent", ""),
+        )
+        print(f"✅ Turn {turn_seq} saved for session {current_session_id}.")
     except Exception as e:
-        print(e)
+        print("❌ Failed to save turn:", e)
 
 # ──────────────────────────────────────────────
 # Agent Setup
 # ──────────────────────────────────────────────
 
-async def start_agent_session(user_id, is_audio=False):
-    agent = build_root_agent(user_id)  # ✅ use agent builder
+async def start_agent_session(user_id, prefetch, live_turns, is_audio=False, explicit_activity=False):
+    # Warm history and support data in the background while the session is created
+    start_prefetch(prefetch, user_id)
+
+    agent = build_root_agent(user_id, prefetch, live_turns)  # ✅ use agent builder
     runner = InMemoryRunner(app_name=APP_NAME, agent=agent)
     session = await runner.session_service.create_session(app_name=APP_NAME, user_id=user_id)
     modality = "AUDIO" if is_audio else "TEXT"
     run_config = RunConfig(response_modalities=[modality])
+    if explicit_activity:
+        # The server-side VAD marks utterances with activity start/end instead
+        run_config.realtime_input_config = RealtimeInputConfig(
+            automatic_activity_detection=AutomaticActivityDetection(disabled=True)
+        )
     live_request_queue = LiveRequestQueue()
     live_events = runner.run_live(session=session, live_request_queue=live_request_queue, run_config=run_config)
 
@@ -190,11 +159,27 @@ async def start_agent_session(user_id, is_audio=False):
 # WebSocket Messaging
 # ──────────────────────────────────────────────
 
-async def agent_to_client_messaging(websocket, live_events, user_id, current_session_id):
+async def send_audio_to_client(websocket, codec, pcm_data):
+    encoded = await encode_from_pcm(codec, pcm_data)
+    await websocket.send_text(json.dumps({
+        "mime_type": CODEC_MIME_TYPES[codec],
+        "data": base64.b64encode(encoded).decode("ascii")
+    }))
+
+async def agent_to_client_messaging(websocket, live_events, user_id, current_session_id, codec=CODEC_PCM, vad=None, live_turns=None):
     global ua_pair
+
+    async def save_turn():
+        await asyncio.to_thread(save_message_to_bq, user_id, dict(ua_pair), current_session_id)
+        # Later history recalls merge this in instead of re-querying BigQuery
+        if live_turns is not None:
+            live_turns.add(current_session_id, ua_pair.get("user", ""), ua_pair.get("agent", ""))
+
     full_text = ""
     full_audio_bytes = b""  # New: Accumulator for agent's raw audio bytes
     turn_saved = False
+    # Compressed codecs batch model audio so per-message overhead stays low
+    batcher = AudioFrameBatcher() if codec != CODEC_PCM else None
 
     async for event in live_events:
         part: Part = event.content and event.content.parts and event.content.parts[0]
@@ -217,18 +202,26 @@ async def agent_to_client_messaging(websocket, live_events, user_id, current_ses
                 full_audio_bytes += audio_data
                 turn_saved = False
                 
-                # Stream audio chunk to client (no changes here)
-                await websocket.send_text(json.dumps({
-                    "mime_type": "audio/pcm",
-                    "data": base64.b64encode(audio_data).decode("ascii")
-                }))
+                # Stream audio chunk to client
+                batch = batcher.add(audio_data) if batcher else audio_data
+                if batch:
+                    await send_audio_to_client(websocket, codec, batch)
 
         # Finalize and save the turn
         if event.turn_complete or event.interrupted:
+            if vad and event.turn_complete:
+                vad.metrics.record_turn_complete()
+
+            # Send whatever audio is still batched, unless the client is about to discard it
+            if batcher:
+                batch = batcher.flush()
+                if batch and not event.interrupted:
+                    await send_audio_to_client(websocket, codec, batch)
+
             # Save text turn if it exists
             if full_text and not turn_saved:
                 ua_pair["agent"] = full_text.split("\n")[0]
-                save_message_to_bq(user_id, ua_pair, current_session_id)
+                await save_turn()
                 turn_saved = True
 
             # Save audio turn if it exists
@@ -237,7 +230,7 @@ async def agent_to_client_messaging(websocket, live_events, user_id, current_ses
                 agent_audio_b64 = base64.b64encode(full_audio_bytes).decode('ascii')
                 agent_text = transcribe_base64_audio(agent_audio_b64)
                 ua_pair["agent"] = agent_text
-                save_message_to_bq(user_id, ua_pair, current_session_id)
+                await save_turn()
                 turn_saved = True
 
             # If a turn was saved, clear the state for the next one
@@ -252,7 +245,13 @@ async def agent_to_client_messaging(websocket, live_events, user_id, current_ses
                 "interrupted": event.interrupted
             }))
 
-async def client_to_agent_messaging(websocket, live_request_queue):
+    # The stream can end without a final turn_complete; do not drop batched audio
+    if batcher:
+        batch = batcher.flush()
+        if batch:
+            await send_audio_to_client(websocket, codec, batch)
+
+async def client_to_agent_messaging(websocket, live_request_queue, vad=None):
     try:
         while True:
             message_json = await websocket.receive_text()
@@ -264,9 +263,22 @@ async def client_to_agent_messaging(websocket, live_request_queue):
             if mime_type == "text/plain":
                 content = Content(role="user", parts=[Part.from_text(text=data)])
                 live_request_queue.send_content(content=content)
-            elif mime_type == "audio/pcm":
-                decoded_data = base64.b64decode(data)
-                live_request_queue.send_realtime(Blob(data=decoded_data, mime_type=mime_type))
+            elif mime_type in MIME_TYPE_CODECS:
+                decoded_data = decode_to_pcm(mime_type, base64.b64decode(data))
+                if not vad:
+                    live_request_queue.send_realtime(Blob(data=decoded_data, mime_type="audio/pcm"))
+                    continue
+                # Forward speech in stream order, bracketed by explicit activity signals
+                for segment in vad.process_segments(decoded_data):
+                    if isinstance(segment, bytes):
+                        live_request_queue.send_realtime(Blob(data=segment, mime_type="audio/pcm"))
+                        continue
+                    if segment == SPEECH_START:
+                        live_request_queue.send_activity_start()
+                    else:
+                        live_request_queue.send_activity_end()
+                        vad.metrics.record_speech_end()
+                    print(f"INFO: VAD {segment}")
             else:
                 raise ValueError(f"Mime type not supported: {mime_type}")
     except WebSocketDisconnect:
@@ -293,18 +305,67 @@ async def root():
 #     return conversation_history.get(user_id, [])
 
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, is_audio: str):
+async def websocket_endpoint(websocket: WebSocket, user_id: int, is_audio: str, codec: str = CODEC_PCM):
     user_id = "Deeppppppeeennnndddrrraaa"
     await websocket.accept()
     user_id_str = str(user_id)
 
-    # load_history_from_bq(user_id_str)
-    # print(conversation_history)
-    # print(user_sessions)
-    live_events, live_request_queue, current_session_id = await start_agent_session(user_id_str, is_audio == "true")
+    # Tell the client which audio codec the server agreed to use
+    codec = negotiate_codec(codec)
+    await websocket.send_text(json.dumps({"codec": codec}))
+
+    async def send_queue_position(position):
+        await websocket.send_text(json.dumps({"queue_position": position}))
 
-    client_task = asyncio.create_task(client_to_agent_messaging(websocket, live_request_queue))
-    agent_task = asyncio.create_task(agent_to_client_messaging(websocket, live_events, user_id_str, current_session_id))
+    session_kind = SESSION_AUDIO if is_audio == "true" else SESSION_TEXT
+    try:
+        await admission.acquire(session_kind, on_position=send_queue_position)
+    except AdmissionRejected as e:
+        print(f"INFO: Rejected {session_kind} session: {e} {admission.stats()}")
+        try:
+            await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason=str(e))
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        return
+    except (WebSocketDisconnect, RuntimeError):
+        # A queue position update failed: the client left while queued
+        print(f"INFO: Client left while waiting for a {session_kind} session.")
+        return
 
-    await asyncio.wait([agent_task, client_task], return_when=asyncio.FIRST_EXCEPTION)
-    live_request_queue.close()
+    try:
+        try:
+            await websocket.send_text(json.dumps({"admitted": True}))
+        except (WebSocketDisconnect, RuntimeError):
+            print(f"INFO: Client left before its {session_kind} session started.")
+            return
+
+        # load_history_from_bq(user_id_str)
+        # print(conversation_history)
+        # print(user_sessions)
+        vad = StreamingVAD(**VAD_CONFIG) if VAD_ENABLED and is_audio == "true" else None
+        # Owned here so pending fetches are dropped even when session setup fails
+        prefetch = SessionPrefetch()
+        live_turns = LiveSessionTurns()
+        try:
+            live_events, live_request_queue, current_session_id = await start_agent_session(
+                user_id_str, prefetch, live_turns, is_audio == "true", explicit_activity=vad is not None
+            )
+
+            client_task = asyncio.create_task(client_to_agent_messaging(websocket, live_request_queue, vad))
+            agent_task = asyncio.create_task(agent_to_client_messaging(
+                websocket, live_events, user_id_str, current_session_id, codec, vad, live_turns
+            ))
+
+            try:
+                await asyncio.wait([agent_task, client_task], return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                history_store.forget_session(current_session_id)
+            live_request_queue.close()
+        finally:
+            # Drop any prefetch still in flight once the socket is gone
+            prefetch.cancel()
+            print(f"INFO: Prefetch stats: {prefetch.stats}")
+            if vad:
+                print(f"INFO: VAD metrics: {vad.metrics.as_dict()}")
+    finally:
+        admission.release(session_kind)
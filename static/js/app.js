@@ -28,6 +28,15 @@ const ws_url =
   "ws://" + window.location.host + "/ws/" + sessionId;
 let websocket = null;
 let is_audio = false;
+// Set once the server grants this socket a session slot. Until then the
+// server is not reading the socket, so nothing is sent.
+let admitted = false;
+
+// Audio transport codec: "pcm" (default) or "mulaw", e.g. /?codec=mulaw.
+// The server confirms the codec it will actually use when the socket opens.
+const requestedCodec =
+  new URLSearchParams(window.location.search).get("codec") || "pcm";
+let audioCodec = "pcm";
 
 // Get DOM elements
 const messageForm = document.getElementById("messageForm");
@@ -35,20 +44,39 @@ const messageInput = document.getElementById("message");
 const messagesDiv = document.getElementById("messages");
 let currentMessageId = null;
 
+// Reconnect delay. A 1013 close means the server is shedding load, so back off
+// exponentially with full jitter instead of every shed client retrying together.
+const RECONNECT_DELAY_MS = 5000;
+const OVERLOAD_BACKOFF_BASE_MS = 2000;
+const OVERLOAD_BACKOFF_MAX_MS = 60000;
+let overloadRetries = 0;
+
+function reconnectDelay(closeCode) {
+  if (closeCode != 1013) {
+    return RECONNECT_DELAY_MS;
+  }
+  const ceiling = Math.min(
+    OVERLOAD_BACKOFF_MAX_MS,
+    OVERLOAD_BACKOFF_BASE_MS * 2 ** overloadRetries
+  );
+  overloadRetries++;
+  return Math.random() * ceiling;
+}
+
 // WebSocket handlers
 function connectWebsocket() {
+  admitted = false;
   // Connect websocket
-  websocket = new WebSocket(ws_url + "?is_audio=" + is_audio);
+  websocket = new WebSocket(
+    ws_url + "?is_audio=" + is_audio + "&codec=" + requestedCodec
+  );
 
   // Handle connection open
   websocket.onopen = function () {
     // Connection opened messages
     console.log("WebSocket connection opened.");
-    document.getElementById("messages").textContent = "Connection opened";
-
-    // Enable the Send button
-    document.getElementById("sendButton").disabled = false;
-    addSubmitHandler();
+    document.getElementById("messages").textContent =
+      "Waiting for an assistant...";
   };
 
   // Handle incoming messages
@@ -57,6 +85,32 @@ function connectWebsocket() {
     const message_from_server = JSON.parse(event.data);
     console.log("[AGENT TO CLIENT] ", message_from_server);
 
+    // Codec negotiated by the server
+    if (message_from_server.codec) {
+      audioCodec = message_from_server.codec;
+      return;
+    }
+
+    // The session got a slot on the server (possibly after queueing)
+    if (message_from_server.admitted) {
+      admitted = true;
+      overloadRetries = 0;
+      document.getElementById("messages").textContent = "Connection opened";
+
+      // Enable the Send button
+      document.getElementById("sendButton").disabled = false;
+      addSubmitHandler();
+      return;
+    }
+
+    // The server is at capacity and has queued this session
+    if (message_from_server.queue_position) {
+      document.getElementById("messages").textContent =
+        "All assistants are busy. Your position in the queue: " +
+        message_from_server.queue_position;
+      return;
+    }
+
     // Check if the turn is complete
     // if turn complete, add new message
     if (
@@ -83,6 +137,11 @@ function connectWebsocket() {
     if (message_from_server.mime_type == "audio/pcm" && audioPlayerNode) {
       audioPlayerNode.port.postMessage(base64ToArray(message_from_server.data));
     }
+    if (message_from_server.mime_type == "audio/x-mulaw" && audioPlayerNode) {
+      audioPlayerNode.port.postMessage(
+        mulawDecode(base64ToArray(message_from_server.data))
+      );
+    }
 
     // If it's a text, print it
     if (message_from_server.mime_type == "text/plain") {
@@ -105,14 +164,17 @@ function connectWebsocket() {
   };
 
   // Handle connection close
-  websocket.onclose = function () {
+  websocket.onclose = function (event) {
     console.log("WebSocket connection closed.");
+    admitted = false;
     document.getElementById("sendButton").disabled = true;
-    document.getElementById("messages").textContent = "Connection closed";
+    document.getElementById("messages").textContent =
+      event.code == 1013 ? event.reason : "Connection closed";
+    const delay = reconnectDelay(event.code);
     setTimeout(function () {
       console.log("Reconnecting...");
       connectWebsocket();
-    }, 5000);
+    }, delay);
   };
 
   websocket.onerror = function (e) {
@@ -143,7 +205,7 @@ function addSubmitHandler() {
 
 // Send a message to the server as a JSON string
 function sendMessage(message) {
-  if (websocket && websocket.readyState == WebSocket.OPEN) {
+  if (admitted && websocket && websocket.readyState == WebSocket.OPEN) {
     const messageJson = JSON.stringify(message);
     websocket.send(messageJson);
   }
@@ -177,6 +239,7 @@ let bufferTimer = null;
 // Import the audio worklets
 import { startAudioPlayerWorklet } from "./audio-player.js";
 import { startAudioRecorderWorklet } from "./audio-recorder.js";
+import { mulawEncode, mulawDecode } from "./mulaw.js";
 
 // Start audio
 function startAudio() {
@@ -221,6 +284,12 @@ function sendBufferedAudio() {
   if (audioBuffer.length === 0) {
     return;
   }
+
+  // Drop audio recorded while queued or reconnecting instead of replaying it later
+  if (!admitted) {
+    audioBuffer = [];
+    return;
+  }
   
   // Calculate total length
   let totalLength = 0;
@@ -236,12 +305,14 @@ function sendBufferedAudio() {
     offset += chunk.length;
   }
   
-  // Send the combined audio data
+  // Send the combined audio data, compressed if the server agreed to a codec
+  const payload =
+    audioCodec == "mulaw" ? mulawEncode(combinedBuffer.buffer) : combinedBuffer;
   sendMessage({
-    mime_type: "audio/pcm",
-    data: arrayBufferToBase64(combinedBuffer.buffer),
+    mime_type: audioCodec == "mulaw" ? "audio/x-mulaw" : "audio/pcm",
+    data: arrayBufferToBase64(payload.buffer),
   });
-  console.log("[CLIENT TO AGENT] sent %s bytes", combinedBuffer.byteLength);
+  console.log("[CLIENT TO AGENT] sent %s bytes", payload.byteLength);
   
   // Clear the buffer
   audioBuffer = [];
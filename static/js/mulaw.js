@@ -0,0 +1,44 @@
+/**
+ * G.711 u-law codec for the optional compressed audio transport.
+ * Mirrors tools/audio_codec.py on the server.
+ */
+
+const MULAW_BIAS = 0x84;
+const MULAW_CLIP = 32635;
+
+// u-law byte -> 16-bit sample
+const decodeTable = new Int16Array(256);
+for (let i = 0; i < 256; i++) {
+  const code = ~i & 0xff;
+  const exponent = (code >> 4) & 0x07;
+  const magnitude = ((((code & 0x0f) << 3) + MULAW_BIAS) << exponent) - MULAW_BIAS;
+  decodeTable[i] = code & 0x80 ? -magnitude : magnitude;
+}
+
+function encodeSample(sample) {
+  const sign = sample < 0 ? 0x80 : 0;
+  const magnitude = Math.min(Math.abs(sample), MULAW_CLIP) + MULAW_BIAS;
+  const exponent = Math.floor(Math.log2((magnitude >> 7) | 1));
+  const mantissa = (magnitude >> (exponent + 3)) & 0x0f;
+  return ~(sign | (exponent << 4) | mantissa) & 0xff;
+}
+
+// Encode an ArrayBuffer of 16-bit PCM to a Uint8Array of u-law bytes.
+export function mulawEncode(pcmBuffer) {
+  const samples = new Int16Array(pcmBuffer);
+  const encoded = new Uint8Array(samples.length);
+  for (let i = 0; i < samples.length; i++) {
+    encoded[i] = encodeSample(samples[i]);
+  }
+  return encoded;
+}
+
+// Decode an ArrayBuffer of u-law bytes to an ArrayBuffer of 16-bit PCM.
+export function mulawDecode(mulawBuffer) {
+  const codes = new Uint8Array(mulawBuffer);
+  const samples = new Int16Array(codes.length);
+  for (let i = 0; i < codes.length; i++) {
+    samples[i] = decodeTable[codes[i]];
+  }
+  return samples.buffer;
+}
@@ -0,0 +1,12 @@
+import importlib
+from unittest import mock
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """Imports main.py without Google Cloud credentials (its BigQuery client is created at import)."""
+    pytest.importorskip("google.adk")
+    with mock.patch("google.cloud.bigquery.Client"):
+        return importlib.import_module("main")
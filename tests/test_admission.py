@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from tools.admission import SESSION_AUDIO, SESSION_TEXT, AdmissionController, AdmissionRejected
+
+
+def controller(max_active=1, max_queued=2, timeout=5.0):
+    return AdmissionController(
+        max_active={SESSION_AUDIO: max_active, SESSION_TEXT: 10},
+        max_queued={SESSION_AUDIO: max_queued, SESSION_TEXT: 10},
+        queue_timeout_s=timeout,
+    )
+
+
+def test_waiters_are_admitted_in_fifo_order_with_position_updates():
+    async def scenario():
+        admission = controller(max_active=1, max_queued=3)
+        await admission.acquire(SESSION_AUDIO)
+        admitted = []
+        positions = {name: [] for name in "abc"}
+
+        async def waiter(name):
+            async def on_position(position):
+                positions[name].append(position)
+            await admission.acquire(SESSION_AUDIO, on_position)
+            admitted.append(name)
+
+        tasks = []
+        for name in "abc":
+            tasks.append(asyncio.create_task(waiter(name)))
+            await asyncio.sleep(0)
+        for _ in "abc":
+            admission.release(SESSION_AUDIO)
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        return admitted, positions
+
+    admitted, positions = asyncio.run(scenario())
+
+    assert admitted == ["a", "b", "c"]
+    assert positions == {"a": [1], "b": [2, 1], "c": [3, 2, 1]}
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        admission = controller(max_active=1, max_queued=1)
+        await admission.acquire(SESSION_AUDIO)
+        queued = asyncio.create_task(admission.acquire(SESSION_AUDIO))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(SESSION_AUDIO)
+        # Text sessions have their own pool
+        await admission.acquire(SESSION_TEXT)
+        queued.cancel()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats[SESSION_AUDIO]["rejected_total"] == 1
+    assert stats[SESSION_TEXT]["active"] == 1
+
+
+def test_rejects_when_queue_wait_times_out():
+    async def scenario():
+        admission = controller(timeout=0.05)
+        await admission.acquire(SESSION_AUDIO)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(SESSION_AUDIO)
+        return admission.stats()[SESSION_AUDIO]
+
+    stats = asyncio.run(scenario())
+
+    assert stats["queued"] == 0
+    assert stats["rejected_total"] == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        admission = controller()
+        await admission.acquire(SESSION_AUDIO)
+        waiter = asyncio.create_task(admission.acquire(SESSION_AUDIO))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued_after_cancel = admission.stats()[SESSION_AUDIO]["queued"]
+        admission.release(SESSION_AUDIO)
+        return queued_after_cancel, admission.stats()[SESSION_AUDIO]["active"]
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_released():
+    async def scenario():
+        admission = controller()
+        await admission.acquire(SESSION_AUDIO)
+        waiter = asyncio.create_task(admission.acquire(SESSION_AUDIO))
+        await asyncio.sleep(0)
+        # Slot is handed over, then the waiter is cancelled before it resumes
+        admission.release(SESSION_AUDIO)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return admission.stats()[SESSION_AUDIO]["active"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_admit_releases_on_exit():
+    async def scenario():
+        admission = controller()
+        with pytest.raises(ValueError):
+            async with admission.admit(SESSION_AUDIO):
+                raise ValueError
+        return admission.stats()[SESSION_AUDIO]["active"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+class GoneWhileQueuedWebSocket:
+    """Accepts, then disconnects on the first queue position update."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        message = json.loads(text)
+        if "queue_position" in message:
+            raise WebSocketDisconnect(1001)
+        self.sent.append(message)
+
+
+def test_endpoint_returns_quietly_when_client_leaves_while_queued(main_module, monkeypatch):
+    admission = controller(max_active=1)
+    monkeypatch.setattr(main_module, "admission", admission)
+
+    async def scenario():
+        await admission.acquire(SESSION_AUDIO)
+        websocket = GoneWhileQueuedWebSocket()
+        await main_module.websocket_endpoint(websocket, 1, "true")
+        return websocket.sent, admission.stats()[SESSION_AUDIO]
+
+    sent, stats = asyncio.run(scenario())
+
+    assert sent == [{"codec": "pcm"}]
+    assert stats["active"] == 1 and stats["queued"] == 0
@@ -0,0 +1,64 @@
+import asyncio
+import base64
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from tools.audio_codec import (
+    CODEC_MULAW, AudioFrameBatcher, decode_to_pcm, mulaw_decode, mulaw_encode, negotiate_codec,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def audio_event(pcm: bytes):
+    part = SimpleNamespace(text=None, inline_data=SimpleNamespace(mime_type="audio/pcm", data=pcm))
+    return SimpleNamespace(
+        content=SimpleNamespace(parts=[part]), partial=True, turn_complete=False, interrupted=False
+    )
+
+
+async def events(*items):
+    for item in items:
+        yield item
+
+
+def test_mulaw_round_trip_is_close():
+    samples = np.linspace(-30000, 30000, 1000).astype("<i2")
+    decoded = np.frombuffer(mulaw_decode(mulaw_encode(samples.tobytes())), dtype="<i2")
+
+    assert len(mulaw_encode(samples.tobytes())) == len(samples)
+    assert np.max(np.abs(decoded.astype(int) - samples.astype(int))) <= 1024
+
+
+def test_negotiate_codec_falls_back_to_pcm():
+    assert negotiate_codec("mulaw") == "mulaw"
+    assert negotiate_codec("opus") == "pcm"
+    assert decode_to_pcm("audio/pcm", b"\x01\x02") == b"\x01\x02"
+
+
+def test_batcher_waits_for_a_full_batch():
+    batcher = AudioFrameBatcher(batch_ms=100, sample_rate=24000)
+
+    assert batcher.add(bytes(2400)) is None
+    assert len(batcher.add(bytes(2400))) == 4800
+    assert batcher.flush() == b""
+
+
+def test_batched_audio_is_flushed_when_the_stream_ends(main_module):
+    websocket = FakeWebSocket()
+    pcm = bytes(960)  # 20 ms at 24 kHz, below one batch
+
+    asyncio.run(main_module.agent_to_client_messaging(
+        websocket, events(audio_event(pcm), audio_event(pcm)), "user", "session", CODEC_MULAW
+    ))
+
+    assert [m["mime_type"] for m in websocket.sent] == ["audio/x-mulaw"]
+    assert len(base64.b64decode(websocket.sent[0]["data"])) == len(pcm)  # 2 x 480 samples, 1 byte each
@@ -0,0 +1,66 @@
+import numpy as np
+
+from tools.audio_vad import SPEECH_END, SPEECH_START, StreamingVAD
+
+SAMPLE_RATE = 16000
+FRAME_BYTES = 320 * 2
+
+
+def tone(ms: int) -> bytes:
+    t = np.arange(SAMPLE_RATE * ms // 1000) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 200 * t) * 0x7fff).astype("<i2").tobytes()
+
+
+def silence(ms: int) -> bytes:
+    return bytes(SAMPLE_RATE * ms // 1000 * 2)
+
+
+def test_speech_is_bracketed_by_start_and_end_in_stream_order():
+    vad = StreamingVAD(hangover_ms=100, preroll_ms=40)
+
+    segments = vad.process_segments(silence(200) + tone(200) + silence(400))
+
+    assert [s if isinstance(s, str) else bytes for s in segments] == [SPEECH_START, bytes, SPEECH_END]
+    # 2 pre-roll frames + 10 speech frames + 5 hangover frames
+    assert len(segments[1]) == 17 * FRAME_BYTES
+    assert not vad.in_speech
+
+
+def test_silence_is_suppressed_and_counted():
+    vad = StreamingVAD()
+
+    assert vad.process_segments(silence(1000)) == []
+    assert vad.metrics.frames_total == 50
+    assert vad.metrics.suppressed_ratio == 1.0
+
+
+def test_partial_frames_are_held_for_the_next_chunk():
+    vad = StreamingVAD(preroll_ms=0)
+    chunk = tone(100)
+
+    first = vad.process_segments(chunk[:FRAME_BYTES + 100])
+    second = vad.process_segments(chunk[FRAME_BYTES + 100:])
+
+    assert first == [SPEECH_START, chunk[:FRAME_BYTES]]
+    assert second == [chunk[FRAME_BYTES:]]
+
+
+def test_process_joins_audio_and_lists_events():
+    vad = StreamingVAD(hangover_ms=0, preroll_ms=0)
+
+    audio, events = vad.process(tone(100) + silence(100) + tone(100))
+
+    assert events == [SPEECH_START, SPEECH_END, SPEECH_START]
+    assert len(audio) == 10 * FRAME_BYTES
+
+
+def test_steady_loud_noise_is_cut_into_bounded_utterances():
+    vad = StreamingVAD(preroll_ms=0, max_utterance_ms=500)
+    noise = (np.random.default_rng(0).normal(0, 0.2, SAMPLE_RATE * 2) * 0x7fff).astype("<i2").tobytes()
+
+    segments = vad.process_segments(noise)
+
+    events = [s for s in segments if isinstance(s, str)]
+    assert events == [SPEECH_START, SPEECH_END] * 4
+    assert all(len(s) == 25 * FRAME_BYTES for s in segments if isinstance(s, bytes))
+    assert vad.metrics.utterances_cut == 4
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from tools.history_store import BigQueryTurnStore, LiveSessionTurns, SQLiteTurnStore, format_history
+
+
+@pytest.fixture
+def store():
+    store = SQLiteTurnStore()
+    store.ensure_table()
+    return store
+
+
+def ago(**kwargs):
+    return datetime.now(timezone.utc) - timedelta(**kwargs)
+
+
+def session_ids(sessions):
+    return [s["session_id"] for s in sessions]
+
+
+def test_append_turn_numbers_turns_per_session(store):
+    assert [store.append_turn("u1", "s1", f"q{i}", f"a{i}") for i in range(3)] == [0, 1, 2]
+    assert store.append_turn("u1", "s2", "q", "a") == 0
+
+    turns = store.get_session_turns("u1", "s1")
+    assert [t["turn_seq"] for t in turns] == [0, 1, 2]
+    assert [t["user"] for t in turns] == ["q0", "q1", "q2"]
+
+
+def test_append_turn_creates_missing_table():
+    store = SQLiteTurnStore()
+
+    store.append_turn("u1", "s1", "q", "a")
+
+    assert [t["user"] for t in store.get_session_turns("u1", "s1")] == ["q"]
+
+
+def test_bigquery_store_creates_table_once_before_first_insert():
+    client = mock.Mock()
+    client.insert_rows_json.return_value = []
+    store = BigQueryTurnStore(client=client, project="p", dataset="d")
+
+    store.append_turn("u1", "s1", "q0", "a0")
+    store.append_turn("u1", "s1", "q1", "a1")
+
+    assert client.create_table.call_count == 1
+    assert [c.args[1][0]["turn_seq"] for c in client.insert_rows_json.call_args_list] == [0, 1]
+
+
+def test_get_session_turns_reads_a_bounded_window(store):
+    store.append_turn("u1", "s1", "old", "a", ago(days=30))
+    store.append_turn("u1", "s1", "new", "a", ago(hours=1))
+
+    assert [t["user"] for t in store.get_session_turns("u1", "s1")] == ["new"]
+    assert [t["user"] for t in store.get_session_turns("u1", "s1", lookback_days=None)] == ["old", "new"]
+
+
+def test_forget_session_releases_counter(store):
+    store.append_turn("u1", "s1", "q", "a")
+    store.forget_session("s1")
+    assert store._sequencer._next == {}
+
+
+def test_load_user_history_returns_newest_sessions_first(store):
+    for i, session_id in enumerate(["s1", "s2", "s3", "s4"]):
+        for turn in range(2):
+            store.append_turn("u1", session_id, f"{session_id}-q{turn}", "a", ago(hours=10 - i))
+    store.append_turn("u2", "other", "q", "a", ago(hours=1))
+
+    sessions = store.load_user_history("u1")
+
+    assert session_ids(sessions) == ["s4", "s3", "s2"]
+    assert [t["user"] for t in sessions[0]["turns"]] == ["s4-q0", "s4-q1"]
+
+
+def test_load_user_history_widens_lookback_until_enough_sessions(store):
+    store.append_turn("u1", "recent", "q", "a", ago(days=1))
+    store.append_turn("u1", "last-month", "q", "a", ago(days=30))
+    store.append_turn("u1", "last-year", "q", "a", ago(days=365))
+
+    assert session_ids(store.load_user_history("u1")) == ["recent", "last-month", "last-year"]
+    assert session_ids(store.load_user_history("u1", lookback_steps=(7,))) == ["recent"]
+
+
+def test_load_user_history_stops_at_first_full_window(store):
+    for i in range(3):
+        store.append_turn("u1", f"new{i}", "q", "a", ago(days=1, minutes=i))
+    store.append_turn("u1", "old", "q", "a", ago(days=365))
+
+    assert session_ids(store.load_user_history("u1")) == ["new0", "new1", "new2"]
+
+
+def test_load_user_history_empty(store):
+    assert store.load_user_history("nobody") == []
+
+
+def test_live_session_turns_lead_the_merged_history():
+    past = [{"session_id": s, "turns": []} for s in ("live", "p1", "p2")]
+    live_turns = LiveSessionTurns()
+
+    assert live_turns.merge_into(past) == past
+
+    live_turns.add("live", "q0", "a0")
+    live_turns.add("live", "q1", "a1")
+    merged = live_turns.merge_into(past)
+
+    assert session_ids(merged) == ["live", "p1", "p2"]
+    assert [t["user"] for t in merged[0]["turns"]] == ["q0", "q1"]
+    assert session_ids(live_turns.merge_into(past, max_sessions=2)) == ["live", "p1"]
+
+
+def test_format_history():
+    sessions = [
+        {"session_id": "s2", "turns": [{"user": "hi", "agent": "hello\nthere"}]},
+        {"session_id": "s1", "turns": [{"user": None, "agent": None}]},
+    ]
+
+    assert format_history(sessions) == (
+        "--- Conversation Session 1 ---\n"
+        "User: hi\nAgent: hello there\n\n"
+        "--- Conversation Session 2 ---\n"
+        "User: N/A\nAgent: N/A\n\n"
+    )
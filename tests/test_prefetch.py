@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tools.prefetch import PREFETCH_HISTORY, PREFETCH_SUPPORT_MATRIX, SessionPrefetch, SharedPrefetch
+
+
+class CountingFetch:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delay)
+        return f"{key}-{call}"
+
+
+def test_shared_prefetch_runs_one_fetch_for_all_sessions():
+    fetch = CountingFetch(delay=0.05)
+
+    async def scenario():
+        cache = SharedPrefetch(ttl_s=60)
+        cache.start(PREFETCH_SUPPORT_MATRIX, fetch, "bucket")
+        # Each "session" starts and then asks, as start_prefetch and the tool do
+        for _ in range(3):
+            cache.start(PREFETCH_SUPPORT_MATRIX, fetch, "bucket")
+        results = await asyncio.gather(*[cache.get(PREFETCH_SUPPORT_MATRIX, fetch, "bucket") for _ in range(5)])
+        return results, cache.stats
+
+    results, stats = asyncio.run(scenario())
+
+    assert fetch.calls == 1
+    assert results == ["bucket-1"] * 5
+    assert stats["joins"] == 5
+
+
+def test_shared_prefetch_refetches_after_ttl():
+    fetch = CountingFetch()
+
+    async def scenario():
+        cache = SharedPrefetch(ttl_s=0.05)
+        first = await cache.get(PREFETCH_SUPPORT_MATRIX, fetch, "bucket")
+        cached = await cache.get(PREFETCH_SUPPORT_MATRIX, fetch, "bucket")
+        await asyncio.sleep(0.1)
+        return first, cached, await cache.get(PREFETCH_SUPPORT_MATRIX, fetch, "bucket")
+
+    assert asyncio.run(scenario()) == ("bucket-1", "bucket-1", "bucket-2")
+
+
+def test_shared_prefetch_does_not_keep_a_failed_fetch():
+    calls = []
+
+    def flaky(key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise RuntimeError("gcs unavailable")
+        return key
+
+    async def scenario():
+        cache = SharedPrefetch(ttl_s=60)
+        cache.start(PREFETCH_SUPPORT_MATRIX, flaky, "bucket")
+        await asyncio.sleep(0.05)
+        return await cache.get(PREFETCH_SUPPORT_MATRIX, flaky, "bucket")
+
+    assert asyncio.run(scenario()) == "bucket"
+    assert len(calls) == 2
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def text_event(text=None, turn_complete=False):
+    part = SimpleNamespace(text=text, inline_data=None)
+    return SimpleNamespace(
+        content=SimpleNamespace(parts=[part]) if text else None,
+        partial=True, turn_complete=turn_complete, interrupted=False,
+    )
+
+
+async def events(*items):
+    for item in items:
+        yield item
+
+
+def test_saved_turns_are_merged_into_prefetched_history(main_module, monkeypatch):
+    from google_search_agent import agent
+    from tools.history_store import LiveSessionTurns
+
+    monkeypatch.setattr(main_module, "save_message_to_bq", lambda *args: None)
+    past = [{"session_id": f"past{i}", "turns": [{"user": "q", "agent": "a"}]} for i in range(3)]
+    fetches = []
+
+    def load_user_history(user_id):
+        fetches.append(user_id)
+        return past
+
+    monkeypatch.setattr(agent.history_store, "load_user_history", load_user_history)
+
+    async def scenario():
+        prefetch, live_turns = SessionPrefetch(), LiveSessionTurns()
+        prefetch.start(PREFETCH_HISTORY, agent.history_store.load_user_history, "u1")
+        main_module.ua_pair["user"] = "question"
+        await main_module.agent_to_client_messaging(
+            FakeWebSocket(), events(text_event("answer"), text_event(turn_complete=True)),
+            "u1", "s1", live_turns=live_turns,
+        )
+        tool = agent.build_history_tool(prefetch, live_turns)
+        return await tool.func("u1")
+
+    history = asyncio.run(scenario())
+
+    assert fetches == ["u1"]
+    assert history.startswith("--- Conversation Session 1 ---\nUser: question\nAgent: answer\n")
+    assert history.count("--- Conversation Session") == 3
+
+
+def test_support_matrix_error_list_is_not_cached(monkeypatch):
+    from google_search_agent import agent
+
+    error_docs = [{"document": "matrix.pdf", "error": "download failed"}]
+    good_docs = [{"document": "matrix.pdf", "content": "L1 support"}]
+    calls = []
+
+    def read_gcs(bucket_name):
+        calls.append(bucket_name)
+        return error_docs if len(calls) <= 2 else good_docs
+
+    monkeypatch.setattr(agent, "_read_gcs_documents", read_gcs)
+    monkeypatch.setattr(agent, "support_matrix_cache", SharedPrefetch(ttl_s=60))
+
+    async def scenario():
+        tool = agent.build_gcs_tool(SessionPrefetch())
+        # The prefetch fails, the tool retries once and returns the errors uncached
+        return [await tool.func() for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [error_docs, good_docs, good_docs]
+    assert len(calls) == 3
+
+
+def test_prefetch_is_cancelled_when_session_setup_fails(main_module, monkeypatch):
+    prefetches = []
+
+    async def failing_session(user_id, prefetch, live_turns, is_audio=False, explicit_activity=False):
+        prefetch.start(PREFETCH_HISTORY, time.sleep, 0.1)
+        prefetches.append(prefetch)
+        raise RuntimeError("create_session failed")
+
+    monkeypatch.setattr(main_module, "start_agent_session", failing_session)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await main_module.websocket_endpoint(FakeWebSocket(), 1, "false")
+        return main_module.admission.stats()[main_module.SESSION_TEXT]["active"]
+
+    assert asyncio.run(scenario()) == 0
+    assert prefetches[0]._tasks == {}
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# ──────────────────────────────────────────────
+# Admission control for live sessions
+# ──────────────────────────────────────────────
+# Each worker process owns one AdmissionController. Audio and text sessions
+# have separate pools, because an audio stream costs far more CPU and upstream
+# quota than a text one. When a pool is full, new sessions wait in a bounded
+# FIFO queue and are told their position as it changes. Once the queue is also
+# full, or the wait times out, the session is rejected so the caller can close
+# the socket with WS_CLOSE_TRY_AGAIN_LATER.
+
+SESSION_AUDIO = "audio"
+SESSION_TEXT = "text"
+
+WS_CLOSE_TRY_AGAIN_LATER = 1013   # RFC 6455: server overloaded, retry later
+
+
+class AdmissionRejected(Exception):
+    """Raised when a session cannot be admitted (queue full or wait timed out)."""
+
+
+class _Waiter:
+    def __init__(self):
+        self.granted = False
+        self.changed = asyncio.Event()
+
+
+class _SessionPool:
+    def __init__(self, max_active: int, max_queued: int):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiters = deque()
+        self.admitted_total = 0
+        self.rejected_total = 0
+
+    def grant_waiting(self):
+        """Hands free slots to the head of the queue and wakes everyone whose position moved."""
+        while self.waiters and self.active < self.max_active:
+            waiter = self.waiters.popleft()
+            self.active += 1
+            waiter.granted = True
+            waiter.changed.set()
+        for waiter in self.waiters:
+            waiter.changed.set()
+
+
+class AdmissionController:
+    """Caps concurrent live sessions per kind, with a bounded wait queue in front of each cap."""
+
+    def __init__(self, max_active: dict, max_queued: dict, queue_timeout_s: float = 30.0):
+        self.queue_timeout_s = queue_timeout_s
+        self._pools = {
+            kind: _SessionPool(max_active[kind], max_queued.get(kind, 0))
+            for kind in max_active
+        }
+
+    async def acquire(self, kind: str, on_position=None) -> float:
+        """
+        Waits for a session slot of the given kind and returns the seconds spent queued.
+
+        on_position, if given, is awaited with the 1-based queue position each
+        time it changes. Raises AdmissionRejected when the queue is full or the
+        wait exceeds queue_timeout_s.
+        """
+        pool = self._pools[kind]
+        if pool.active < pool.max_active and not pool.waiters:
+            pool.active += 1
+            pool.admitted_total += 1
+            return 0.0
+        if len(pool.waiters) >= pool.max_queued:
+            pool.rejected_total += 1
+            raise AdmissionRejected(f"Too many {kind} sessions; please try again later.")
+
+        waiter = _Waiter()
+        pool.waiters.append(waiter)
+        started = time.monotonic()
+        deadline = started + self.queue_timeout_s
+        last_position = None
+        try:
+            while not waiter.granted:
+                # Clear before reporting so a change during the await is not missed
+                waiter.changed.clear()
+                position = pool.waiters.index(waiter) + 1
+                if on_position and position != last_position:
+                    await on_position(position)
+                    last_position = position
+                if waiter.granted:
+                    break
+                # Not wait_for: it can swallow a cancel that races with the grant,
+                # leaving a cancelled caller holding a slot it never releases
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                try:
+                    done, _ = await asyncio.wait({changed}, timeout=max(0.0, deadline - time.monotonic()))
+                finally:
+                    changed.cancel()
+                if not done:
+                    raise asyncio.TimeoutError
+        except BaseException as e:
+            if waiter.granted:
+                self.release(kind)
+            else:
+                pool.waiters.remove(waiter)
+                pool.grant_waiting()
+            if isinstance(e, asyncio.TimeoutError):
+                pool.rejected_total += 1
+                raise AdmissionRejected(f"Timed out waiting for a free {kind} session slot.") from None
+            raise
+        pool.admitted_total += 1
+        return time.monotonic() - started
+
+    def release(self, kind: str):
+        pool = self._pools[kind]
+        pool.active -= 1
+        pool.grant_waiting()
+
+    @asynccontextmanager
+    async def admit(self, kind: str, on_position=None):
+        """Holds a session slot for the duration of the block."""
+        await self.acquire(kind, on_position)
+        try:
+            yield
+        finally:
+            self.release(kind)
+
+    def stats(self) -> dict:
+        return {
+            kind: {
+                "active": pool.active,
+                "queued": len(pool.waiters),
+                "max_active": pool.max_active,
+                "max_queued": pool.max_queued,
+                "admitted_total": pool.admitted_total,
+                "rejected_total": pool.rejected_total,
+            }
+            for kind, pool in self._pools.items()
+        }
@@ -0,0 +1,107 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ──────────────────────────────────────────────
+# Browser <-> server audio transport codecs
+# ──────────────────────────────────────────────
+# "pcm" is the original raw 16-bit transport. "mulaw" is G.711 u-law: 8 bits
+# per sample, so half the bytes on the wire, and cheap enough to implement in
+# plain JS on the browser side (static/js/mulaw.js). The model itself always
+# sees PCM: inbound audio is decoded before send_realtime and outbound model
+# audio is encoded just before it goes to the socket.
+
+CODEC_PCM = "pcm"
+CODEC_MULAW = "mulaw"
+
+CODEC_MIME_TYPES = {
+    CODEC_PCM: "audio/pcm",
+    CODEC_MULAW: "audio/x-mulaw",
+}
+MIME_TYPE_CODECS = {mime: codec for codec, mime in CODEC_MIME_TYPES.items()}
+
+OUTBOUND_BATCH_MS = 100           # model audio is sent in batches of at least this much
+OUTBOUND_SAMPLE_RATE = 24000      # model output rate (see static/js/audio-player.js)
+ENCODER_WORKERS = 4
+
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 32635
+
+
+def _build_mulaw_tables():
+    """Precomputes int16 -> u-law and u-law -> int16 lookup tables."""
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    sign = np.where(samples < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(samples), _MULAW_CLIP) + _MULAW_BIAS
+    exponent = np.floor(np.log2(magnitude >> 7 | 1)).astype(np.int32)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    encoded = (~(sign | (exponent << 4) | mantissa)) & 0xFF
+    # Index by the sample's unsigned 16-bit view so encoding is a single gather.
+    encode_table = np.empty(65536, dtype=np.uint8)
+    encode_table[samples.astype(np.uint16)] = encoded
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = ((((codes & 0x0F) << 3) + _MULAW_BIAS) << ((codes >> 4) & 0x07)) - _MULAW_BIAS
+    decode_table = np.where(codes & 0x80, -magnitude, magnitude).astype("<i2")
+    return encode_table, decode_table
+
+
+_MULAW_ENCODE_TABLE, _MULAW_DECODE_TABLE = _build_mulaw_tables()
+
+
+def mulaw_encode(pcm: bytes) -> bytes:
+    """Encodes little-endian PCM16 bytes to G.711 u-law."""
+    samples = np.frombuffer(pcm, dtype="<u2", count=len(pcm) // 2)
+    return _MULAW_ENCODE_TABLE[samples].tobytes()
+
+
+def mulaw_decode(data: bytes) -> bytes:
+    """Decodes G.711 u-law bytes to little-endian PCM16."""
+    return _MULAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+_ENCODERS = {CODEC_PCM: bytes, CODEC_MULAW: mulaw_encode}
+_DECODERS = {CODEC_PCM: bytes, CODEC_MULAW: mulaw_decode}
+
+_encode_pool = ThreadPoolExecutor(max_workers=ENCODER_WORKERS, thread_name_prefix="audio-encode")
+
+
+def negotiate_codec(requested) -> str:
+    """Returns the requested codec if supported, otherwise falls back to raw PCM."""
+    return requested if requested in _ENCODERS else CODEC_PCM
+
+
+def decode_to_pcm(mime_type: str, data: bytes) -> bytes:
+    """Decodes an inbound audio payload, identified by its mime type, to PCM16."""
+    codec = MIME_TYPE_CODECS.get(mime_type)
+    if codec is None:
+        raise ValueError(f"Mime type not supported: {mime_type}")
+    return _DECODERS[codec](data)
+
+
+async def encode_from_pcm(codec: str, pcm: bytes) -> bytes:
+    """Encodes outbound PCM16 in the shared encoder pool, off the event loop."""
+    if codec == CODEC_PCM:
+        return pcm
+    return await asyncio.get_running_loop().run_in_executor(_encode_pool, _ENCODERS[codec], pcm)
+
+
+class AudioFrameBatcher:
+    """Coalesces small model audio chunks so each socket message carries at least batch_ms."""
+
+    def __init__(self, batch_ms: int = OUTBOUND_BATCH_MS, sample_rate: int = OUTBOUND_SAMPLE_RATE):
+        self.batch_bytes = sample_rate * batch_ms // 1000 * 2
+        self._buffer = bytearray()
+
+    def add(self, pcm: bytes):
+        """Buffers pcm and returns a full batch once enough audio has accumulated, else None."""
+        self._buffer += pcm
+        if len(self._buffer) < self.batch_bytes:
+            return None
+        return self.flush()
+
+    def flush(self) -> bytes:
+        batch = bytes(self._buffer)
+        self._buffer.clear()
+        return batch
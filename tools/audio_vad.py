@@ -0,0 +1,199 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# ──────────────────────────────────────────────
+# Streaming Voice-Activity Detection
+# ──────────────────────────────────────────────
+# Runs on the 16 kHz / 16-bit mono PCM sent by the browser recorder and drops
+# silent frames before they reach live_request_queue.send_realtime. Energy and
+# zero-crossing rate are computed for all frames of a chunk at once; only the
+# small speech/silence state machine walks the frames one by one.
+#
+# The detector owns turn boundaries: main.py turns off the model's automatic
+# activity detection and sends an explicit activity start/end around each
+# utterance, so the model does not have to wait for a stalled stream to time
+# out. Hangover keeps forwarding audio for a while after speech stops, so short
+# pauses between words do not split one utterance into several turns. Pre-roll
+# replays a few frames from just before speech onset so word starts are not
+# clipped. Because nothing else ends a turn, an utterance is cut with a forced
+# SPEECH_END after max_utterance_ms: steady background noise loud enough to
+# count as speech would otherwise hold the turn open and the model would never
+# answer. Speech that continues past the cut starts a new utterance.
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+class VADMetrics:
+    """Per-stream counters for the VAD stage."""
+
+    def __init__(self):
+        self.frames_total = 0
+        self.frames_forwarded = 0
+        self.process_seconds = 0.0
+        # Speech end -> model turn_complete, to watch end-of-turn latency
+        self.speech_end_at = None
+        self.turns_completed = 0
+        self.turn_end_latency_total = 0.0
+        self.turn_end_latency_max = 0.0
+        self.utterances_cut = 0
+
+    def record_speech_end(self):
+        self.speech_end_at = time.monotonic()
+
+    def record_turn_complete(self):
+        if self.speech_end_at is None:
+            return
+        latency = time.monotonic() - self.speech_end_at
+        self.speech_end_at = None
+        self.turns_completed += 1
+        self.turn_end_latency_total += latency
+        self.turn_end_latency_max = max(self.turn_end_latency_max, latency)
+
+    @property
+    def frames_suppressed(self) -> int:
+        return self.frames_total - self.frames_forwarded
+
+    @property
+    def suppressed_ratio(self) -> float:
+        return self.frames_suppressed / self.frames_total if self.frames_total else 0.0
+
+    @property
+    def seconds_per_frame(self) -> float:
+        return self.process_seconds / self.frames_total if self.frames_total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "frames_total": self.frames_total,
+            "frames_forwarded": self.frames_forwarded,
+            "frames_suppressed": self.frames_suppressed,
+            "suppressed_ratio": round(self.suppressed_ratio, 4),
+            "us_per_frame": round(self.seconds_per_frame * 1e6, 2),
+            "turns_completed": self.turns_completed,
+            "turn_end_latency_avg_ms": round(
+                self.turn_end_latency_total / self.turns_completed * 1e3 if self.turns_completed else 0.0, 1
+            ),
+            "turn_end_latency_max_ms": round(self.turn_end_latency_max * 1e3, 1),
+            "utterances_cut": self.utterances_cut,
+        }
+
+
+class StreamingVAD:
+    """Stateful energy/zero-crossing VAD over a stream of PCM16 chunks."""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = -45.0,
+        loud_margin_db: float = 15.0,
+        max_zcr: float = 0.35,
+        hangover_ms: int = 600,
+        preroll_ms: int = 200,
+        max_utterance_ms: int = 15000,
+    ):
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_len * 2
+        self.threshold_db = threshold_db
+        self.loud_db = threshold_db + loud_margin_db
+        self.max_zcr = max_zcr
+        self.hangover_frames = max(0, hangover_ms // frame_ms)
+        self.max_utterance_frames = max(1, max_utterance_ms // frame_ms)
+
+        self.in_speech = False
+        self.metrics = VADMetrics()
+        self._hangover_left = 0
+        self._utterance_frames = 0
+        self._pending = b""
+        self._preroll = deque(maxlen=max(0, preroll_ms // frame_ms))
+
+    def classify(self, samples: np.ndarray) -> np.ndarray:
+        """Returns a speech flag per row of a (n_frames, frame_len) int16 array."""
+        frames = samples.astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        level_db = 20.0 * np.log10(rms / 32768.0 + 1e-10)
+
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+
+        # Quiet broadband noise (fans, hiss) crosses zero far more often than voiced speech.
+        return (level_db >= self.loud_db) | ((level_db >= self.threshold_db) & (zcr <= self.max_zcr))
+
+    def process_segments(self, pcm: bytes) -> list:
+        """
+        Feeds one chunk of PCM16 audio through the detector.
+
+        Returns the chunk's output in stream order: bytes items are audio to
+        forward, str items are SPEECH_START / SPEECH_END markers. Bytes that do
+        not fill a whole frame are held until the next call.
+        """
+        started = time.perf_counter()
+        data = self._pending + pcm
+        n_frames = len(data) // self.frame_bytes
+        self._pending = data[n_frames * self.frame_bytes:]
+        if n_frames == 0:
+            return []
+
+        samples = np.frombuffer(data, dtype="<i2", count=n_frames * self.frame_len)
+        is_speech = self.classify(samples.reshape(n_frames, self.frame_len))
+
+        segments = []
+        forwarded = []   # frames of the audio segment being built
+        n_forwarded = 0
+
+        def close_audio_segment():
+            if forwarded:
+                segments.append(b"".join(forwarded))
+                forwarded.clear()
+
+        def end_utterance():
+            self.in_speech = False
+            self._hangover_left = 0
+            close_audio_segment()
+            segments.append(SPEECH_END)
+
+        for i, speech in enumerate(is_speech.tolist()):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            if speech:
+                if not self.in_speech:
+                    self.in_speech = True
+                    self._utterance_frames = 0
+                    segments.append(SPEECH_START)
+                    forwarded.extend(self._preroll)
+                    n_forwarded += len(self._preroll)
+                    self._preroll.clear()
+                self._hangover_left = self.hangover_frames
+                forwarded.append(frame)
+                n_forwarded += 1
+            elif self.in_speech and self._hangover_left > 0:
+                self._hangover_left -= 1
+                forwarded.append(frame)
+                n_forwarded += 1
+            else:
+                if self.in_speech:
+                    end_utterance()
+                self._preroll.append(frame)
+                continue
+
+            self._utterance_frames += 1
+            if self._utterance_frames >= self.max_utterance_frames:
+                end_utterance()
+                self.metrics.utterances_cut += 1
+        close_audio_segment()
+
+        self.metrics.frames_total += n_frames
+        self.metrics.frames_forwarded += n_forwarded
+        self.metrics.process_seconds += time.perf_counter() - started
+        return segments
+
+    def process(self, pcm: bytes):
+        """
+        Like process_segments(), but returns (audio_to_forward, events) with
+        all forwarded audio of the chunk joined together.
+        """
+        segments = self.process_segments(pcm)
+        audio = b"".join(s for s in segments if isinstance(s, bytes))
+        events = [s for s in segments if isinstance(s, str)]
+        return audio, events
@@ -0,0 +1,335 @@
+import itertools
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+# ──────────────────────────────────────────────
+# Turn-level conversation storage
+# ──────────────────────────────────────────────
+# One row per user/agent turn, appended and never rewritten. The BigQuery
+# table is partitioned by DATE(timestamp) and clustered on (user_id,
+# session_id), so history lookups only touch the recent partitions and the
+# blocks belonging to a single user. The table is created on the first
+# append if it does not exist yet, so a fresh deployment does not need the
+# backfill in tools/migrate_history.py before it can store turns.
+#
+# google-cloud-bigquery is imported lazily so SQLiteTurnStore can be used
+# (in tests and benchmarks) without it installed.
+
+BQ_PROJECT = "generativeai-coe"
+BQ_DATASET = "AgentDevelopmentKit"
+BQ_TURNS_TABLE = "convo_turns"
+
+HISTORY_MAX_SESSIONS = 3     # most recent sessions returned to the agent
+# History recall starts with the newest partitions and widens the window
+# until HISTORY_MAX_SESSIONS sessions are found; None means no cutoff.
+HISTORY_LOOKBACK_STEPS = (7, 90, None)
+# A single session lasts minutes to hours, so its turns are always in the
+# newest partitions.
+SESSION_LOOKBACK_DAYS = HISTORY_LOOKBACK_STEPS[0]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def turns_table_schema() -> list:
+    from google.cloud import bigquery
+
+    return [
+        bigquery.SchemaField("user_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("session_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("turn_seq", "INT64", mode="REQUIRED"),
+        bigquery.SchemaField("user", "STRING"),
+        bigquery.SchemaField("agent", "STRING"),
+        bigquery.SchemaField("timestamp", "TIMESTAMP", mode="REQUIRED"),
+    ]
+
+
+def _since(lookback_days) -> datetime:
+    """Start of the lookback window; the epoch when lookback_days is None."""
+    if lookback_days is None:
+        return _EPOCH
+    return datetime.now(timezone.utc) - timedelta(days=lookback_days)
+
+
+def _group_turns_by_session(rows) -> list:
+    """Folds (session_id, user, agent) rows, already ordered, into session dicts."""
+    sessions = []
+    for session_id, turns in itertools.groupby(rows, key=lambda r: r["session_id"]):
+        sessions.append({
+            "session_id": session_id,
+            "turns": [{"user": t["user"], "agent": t["agent"]} for t in turns],
+        })
+    return sessions
+
+
+class _TurnSequencer:
+    """
+    Hands out per-session turn numbers for the sessions owned by this worker.
+
+    Every socket gets a fresh session id from InMemoryRunner, so a session
+    seen for the first time always starts at 0. forget() must be called when
+    the session ends so the map does not grow for the life of the worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def next(self, session_id: str) -> int:
+        with self._lock:
+            seq = self._next.get(session_id, 0)
+            self._next[session_id] = seq + 1
+            return seq
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._next.pop(session_id, None)
+
+
+class _TurnStore(ABC):
+    """Access interface and logic shared by the BigQuery and SQLite stores."""
+
+    def __init__(self):
+        self._sequencer = _TurnSequencer()
+        self._table_lock = threading.Lock()
+        self._table_ready = False
+
+    @abstractmethod
+    def ensure_table(self):
+        """Creates the turns table if it does not exist."""
+
+    @abstractmethod
+    def _insert_turn(self, row: dict):
+        """Writes one turn row."""
+
+    @abstractmethod
+    def _load_user_history(self, user_id: str, max_sessions: int, since: datetime) -> list:
+        """Returns up to max_sessions sessions with turns newer than since, newest first."""
+
+    @abstractmethod
+    def get_session_turns(self, user_id: str, session_id: str, lookback_days=SESSION_LOOKBACK_DAYS) -> list:
+        """Returns the turns of a single session in order, looking back lookback_days."""
+
+    def _ensure_table_once(self):
+        with self._table_lock:
+            if not self._table_ready:
+                self.ensure_table()
+                self._table_ready = True
+
+    def append_turn(self, user_id: str, session_id: str, user: str, agent: str, timestamp=None) -> int:
+        """Appends one turn, creating the table on first use, and returns its turn_seq."""
+        self._ensure_table_once()
+        turn_seq = self._sequencer.next(session_id)
+        self._insert_turn({
+            "user_id": user_id,
+            "session_id": session_id,
+            "turn_seq": turn_seq,
+            "user": user,
+            "agent": agent,
+            "timestamp": (timestamp or datetime.now(timezone.utc)).isoformat(),
+        })
+        return turn_seq
+
+    def forget_session(self, session_id: str):
+        """Drops the turn counter of a session that has ended."""
+        self._sequencer.forget(session_id)
+
+    def load_user_history(self, user_id: str, max_sessions: int = HISTORY_MAX_SESSIONS,
+                          lookback_steps=HISTORY_LOOKBACK_STEPS) -> list:
+        """
+        Returns the user's most recent sessions, newest first, turns in order.
+
+        Each step in lookback_steps is a wider window (in days) over the newest
+        partitions; the first window holding max_sessions sessions wins, and the
+        last step is used as is.
+        """
+        sessions = []
+        for lookback_days in lookback_steps:
+            sessions = self._load_user_history(user_id, max_sessions, _since(lookback_days))
+            if len(sessions) >= max_sessions:
+                break
+        return sessions
+
+
+class BigQueryTurnStore(_TurnStore):
+    """Append-only turn store backed by the partitioned BigQuery table."""
+
+    def __init__(self, client=None, project=BQ_PROJECT, dataset=BQ_DATASET, table=BQ_TURNS_TABLE):
+        super().__init__()
+        self._client = client
+        self.table_id = f"{project}.{dataset}.{table}"
+
+    @property
+    def client(self):
+        # Created on first use so importing the agent does not need credentials
+        if self._client is None:
+            from google.cloud import bigquery
+
+            self._client = bigquery.Client()
+        return self._client
+
+    def _query(self, query: str, params: list):
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter(name, type_, value) for name, type_, value in params
+        ])
+        return self.client.query(query, job_config=job_config).result()
+
+    def ensure_table(self):
+        """Creates the turns table with its partitioning and clustering if missing."""
+        from google.cloud import bigquery
+
+        table = bigquery.Table(self.table_id, schema=turns_table_schema())
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field="timestamp"
+        )
+        table.clustering_fields = ["user_id", "session_id"]
+        table.require_partition_filter = True
+        return self.client.create_table(table, exists_ok=True)
+
+    def _insert_turn(self, row: dict):
+        # Streaming insert: the row is queryable right away and never rewritten
+        errors = self.client.insert_rows_json(self.table_id, [row])
+        if errors:
+            raise RuntimeError(f"Failed to append turn to {self.table_id}: {errors}")
+
+    def _load_user_history(self, user_id: str, max_sessions: int, since: datetime) -> list:
+        query = f"""
+        WITH recent_sessions AS (
+          SELECT session_id, MAX(timestamp) AS latest_timestamp
+          FROM `{self.table_id}`
+          WHERE user_id = @user_id AND timestamp >= @since
+          GROUP BY session_id
+          ORDER BY latest_timestamp DESC
+          LIMIT @max_sessions
+        )
+        SELECT t.session_id, t.turn_seq, t.user, t.agent
+        FROM `{self.table_id}` t
+        JOIN recent_sessions r USING (session_id)
+        WHERE t.user_id = @user_id AND t.timestamp >= @since
+        ORDER BY r.latest_timestamp DESC, t.session_id, t.turn_seq"""
+        rows = self._query(query, [
+            ("user_id", "STRING", user_id),
+            ("since", "TIMESTAMP", since),
+            ("max_sessions", "INT64", max_sessions),
+        ])
+        return _group_turns_by_session(rows)
+
+    def get_session_turns(self, user_id: str, session_id: str, lookback_days=SESSION_LOOKBACK_DAYS) -> list:
+        """Returns the turns of a single session in order, scanning only the last lookback_days partitions."""
+        query = f"""
+        SELECT turn_seq, user, agent, timestamp
+        FROM `{self.table_id}`
+        WHERE user_id = @user_id AND session_id = @session_id AND timestamp >= @since
+        ORDER BY turn_seq"""
+        rows = self._query(query, [
+            ("user_id", "STRING", user_id),
+            ("session_id", "STRING", session_id),
+            ("since", "TIMESTAMP", _since(lookback_days)),
+        ])
+        return [dict(row.items()) for row in rows]
+
+
+class SQLiteTurnStore(_TurnStore):
+    """Same interface as BigQueryTurnStore on a local SQLite file, for tests and benchmarks."""
+
+    def __init__(self, path: str = ":memory:"):
+        super().__init__()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+    def ensure_table(self):
+        with self._lock, self.conn:
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS convo_turns (
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                turn_seq INTEGER NOT NULL,
+                user TEXT,
+                agent TEXT,
+                timestamp TEXT NOT NULL,
+                PRIMARY KEY (user_id, session_id, turn_seq)
+            )""")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS convo_turns_user_ts ON convo_turns (user_id, timestamp)"
+            )
+
+    def _insert_turn(self, row: dict):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO convo_turns VALUES "
+                "(:user_id, :session_id, :turn_seq, :user, :agent, :timestamp)",
+                row,
+            )
+
+    def _load_user_history(self, user_id: str, max_sessions: int, since: datetime) -> list:
+        since = since.isoformat()
+        with self._lock:
+            rows = self.conn.execute("""
+            WITH recent_sessions AS (
+              SELECT session_id, MAX(timestamp) AS latest_timestamp
+              FROM convo_turns
+              WHERE user_id = ? AND timestamp >= ?
+              GROUP BY session_id
+              ORDER BY latest_timestamp DESC
+              LIMIT ?
+            )
+            SELECT t.session_id, t.turn_seq, t.user, t.agent
+            FROM convo_turns t
+            JOIN recent_sessions r USING (session_id)
+            WHERE t.user_id = ? AND t.timestamp >= ?
+            ORDER BY r.latest_timestamp DESC, t.session_id, t.turn_seq""",
+                (user_id, since, max_sessions, user_id, since),
+            ).fetchall()
+        return _group_turns_by_session(rows)
+
+    def get_session_turns(self, user_id: str, session_id: str, lookback_days=SESSION_LOOKBACK_DAYS) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT turn_seq, user, agent, timestamp FROM convo_turns
+                WHERE user_id = ? AND session_id = ? AND timestamp >= ?
+                ORDER BY turn_seq""",
+                (user_id, session_id, _since(lookback_days).isoformat()),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class LiveSessionTurns:
+    """
+    Turns of the session in progress, kept in memory as they are saved.
+
+    History is prefetched once when the socket opens; merging these turns in
+    gives later recalls the same result as a fresh query, without one.
+    """
+
+    def __init__(self):
+        self.session_id = None
+        self.turns = []
+
+    def add(self, session_id: str, user: str, agent: str):
+        self.session_id = session_id
+        self.turns.append({"user": user, "agent": agent})
+
+    def merge_into(self, sessions: list, max_sessions: int = HISTORY_MAX_SESSIONS) -> list:
+        """Puts the live session first in load_user_history() output, as the newest session."""
+        if not self.turns:
+            return sessions
+        past = [s for s in sessions if s["session_id"] != self.session_id]
+        return [{"session_id": self.session_id, "turns": list(self.turns)}] + past[:max_sessions - 1]
+
+
+def format_history(sessions: list) -> str:
+    """Renders load_user_history() output as the plain-text transcript the agents expect."""
+    formatted_history = ""
+    for i, session in enumerate(sessions):
+        formatted_history += f"--- Conversation Session {i+1} ---\n"
+        for turn in session["turns"]:
+            user_query = turn.get("user") or "N/A"
+            # Flatten newlines in agent response for cleaner output
+            agent_response = (turn.get("agent") or "N/A").replace("\n", " ")
+            formatted_history += f"User: {user_query}\nAgent: {agent_response}\n"
+        formatted_history += "\n"
+    return formatted_history
@@ -0,0 +1,71 @@
+import argparse
+
+from google.cloud import bigquery
+
+from tools.history_store import BQ_PROJECT, BQ_DATASET, BQ_TURNS_TABLE, BigQueryTurnStore
+
+# ──────────────────────────────────────────────
+# Backfill convo_pairs_rajat -> convo_turns
+# ──────────────────────────────────────────────
+# The legacy table keeps one row per session with a user_agent_pairs array.
+# The backfill flattens each array into one row per turn in a single
+# server-side INSERT ... SELECT, using the array offset as turn_seq. Legacy
+# rows only carry the session start time, so every turn of a session gets
+# that timestamp (and lands in the same partition).
+
+LEGACY_TABLE = "convo_pairs_rajat"
+
+
+def backfill_turns_from_pairs(client=None, project=BQ_PROJECT, dataset=BQ_DATASET,
+                              source_table=LEGACY_TABLE, target_table=BQ_TURNS_TABLE,
+                              dry_run=False):
+    """Copies every legacy session into the turns table, skipping sessions already migrated."""
+    client = client or bigquery.Client()
+    store = BigQueryTurnStore(client=client, project=project, dataset=dataset, table=target_table)
+    store.ensure_table()
+
+    source_id = f"{project}.{dataset}.{source_table}"
+    query = f"""
+    INSERT INTO `{store.table_id}` (user_id, session_id, turn_seq, user, agent, timestamp)
+    SELECT
+      s.user_id,
+      s.session_id,
+      pair_offset AS turn_seq,
+      pair.user,
+      pair.agent,
+      TIMESTAMP(s.timestamp) AS timestamp
+    FROM `{source_id}` s,
+      UNNEST(s.user_agent_pairs) AS pair WITH OFFSET AS pair_offset
+    WHERE NOT EXISTS (
+      SELECT 1
+      FROM `{store.table_id}` t
+      WHERE t.timestamp >= TIMESTAMP('1970-01-01')
+        AND t.user_id = s.user_id
+        AND t.session_id = s.session_id
+    )"""
+    job_config = bigquery.QueryJobConfig(dry_run=dry_run)
+    job = client.query(query, job_config=job_config)
+    if dry_run:
+        print(f"Dry run: backfill would process {job.total_bytes_processed} bytes.")
+        return job
+    job.result()
+    print(f"✅ Backfilled {job.num_dml_affected_rows} turns from {source_id} into {store.table_id}.")
+    return job
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the turn-level history table from the legacy pairs table.")
+    parser.add_argument("--project", default=BQ_PROJECT)
+    parser.add_argument("--dataset", default=BQ_DATASET)
+    parser.add_argument("--source-table", default=LEGACY_TABLE)
+    parser.add_argument("--target-table", default=BQ_TURNS_TABLE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    backfill_turns_from_pairs(
+        project=args.project,
+        dataset=args.dataset,
+        source_table=args.source_table,
+        target_table=args.target_table,
+        dry_run=args.dry_run,
+    )
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+# ──────────────────────────────────────────────
+# Speculative per-session prefetch
+# ──────────────────────────────────────────────
+# When a socket opens we already know the user, so the slow lookups a tool
+# may need later (BigQuery history, the GCS support matrix) are started right
+# away in worker threads, in parallel with session creation. Tools then ask
+# the prefetch for the same (name, args): a finished fetch is returned
+# directly, an in-flight one is joined, and anything not prefetched is
+# fetched once and cached for the rest of the session. cancel() drops all
+# pending fetches when the socket closes.
+#
+# Data that is the same for every user (the support matrix) lives in one
+# worker-wide SharedPrefetch instead: sessions join a single in-flight fetch,
+# and the result is reused until it is ttl_s old.
+
+PREFETCH_HISTORY = "history"
+PREFETCH_SUPPORT_MATRIX = "support_matrix"
+
+
+class SessionPrefetch:
+    """Per-session cache of speculative fetches, keyed by name and arguments."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.stats = {"hits": 0, "joins": 0, "misses": 0}
+
+    def _spawn(self, key, func, args):
+        task = asyncio.create_task(asyncio.to_thread(func, *args), name=f"prefetch-{key[0]}")
+        # Mark failures as retrieved; get() handles them when a tool actually asks
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[key] = task
+        return task
+
+    def start(self, name: str, func, *args):
+        """Starts fetching func(*args) in the background unless it is already running."""
+        key = (name, *args)
+        if key not in self._tasks:
+            self._spawn(key, func, args)
+
+    async def get(self, name: str, func, *args):
+        """Returns the prefetched result, joining the fetch if it is still in flight."""
+        key = (name, *args)
+        task = self._tasks.get(key)
+        if task is None or task.cancelled():
+            self.stats["misses"] += 1
+            task = self._spawn(key, func, args)
+        elif task.done():
+            self.stats["hits"] += 1
+        else:
+            self.stats["joins"] += 1
+
+        try:
+            # Shield the shared fetch so one cancelled tool call does not cancel it for others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Do not keep a failed fetch around; retry once on the caller's behalf
+            self._tasks.pop(key, None)
+            return await asyncio.to_thread(func, *args)
+
+    def cancel(self):
+        """
+        Cancels fetches that are still pending.
+
+        A blocking call already running in a worker thread finishes in the
+        background, but nobody waits on it and its result is discarded.
+        """
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+class SharedPrefetch(SessionPrefetch):
+    """Worker-wide cache shared by all sessions; finished results expire after ttl_s."""
+
+    def __init__(self, ttl_s: float):
+        super().__init__()
+        self.ttl_s = ttl_s
+        self._expires_at = {}
+
+    def _spawn(self, key, func, args):
+        task = super()._spawn(key, func, args)
+        self._expires_at.pop(key, None)
+        task.add_done_callback(lambda t: self._expires_at.__setitem__(key, time.monotonic() + self.ttl_s))
+        return task
+
+    def _drop_expired(self, key):
+        expires_at = self._expires_at.get(key)
+        if expires_at is not None and time.monotonic() >= expires_at:
+            self._tasks.pop(key, None)
+            del self._expires_at[key]
+
+    def start(self, name: str, func, *args):
+        self._drop_expired((name, *args))
+        super().start(name, func, *args)
+
+    async def get(self, name: str, func, *args):
+        self._drop_expired((name, *args))
+        return await super().get(name, func, *args)